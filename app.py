@@ -1,25 +1,38 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, Request, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-import pytesseract
-import cv2
-import numpy as np
 import os
-import re
+import json
+import asyncio
+import zipfile
+import time
 from typing import Optional, List
-import base64
-from PIL import Image
 import io
-import imutils
 from datetime import datetime, timedelta
 
 # Import database models and schemas
-from database import get_db, Owner, Vehicle, DetectionLog, User, ViolationType, Violation, Payment, Appeal, AuditLog, ViolationStatus, PaymentStatus, PaymentMethod, AppealStatus
+from database import get_db, get_read_db, SessionLocal, normalize_plate_number, Owner, Vehicle, DetectionLog, User, ViolationType, Violation, Payment, Appeal, AuditLog, ViolationStatus, PaymentStatus, PaymentMethod, AppealStatus
 import schemas
+from plate_cache import registry_cache, lookup_vehicle, lookup_vehicles
+from hotlist import hotlist
+from detection import (
+    MAX_PLATES_PER_IMAGE, decode_image, decode_data_url, read_plate_candidates, log_plate_results,
+    rank_matches, plate_result, detection_log_row, warm_up
+)
+from log_writer import log_writer
+from log_archive import LOG_RETENTION_DAYS, retention_loop, query_logs, get_log, archive_stats
+from cache_sync import CACHE_SYNC, cache_sync, sync_loop
+from ocr import OCR_WORKERS
+from ocr_cache import ocr_cache
+from frame_dedupe import FRAME_DEDUPE, frame_index, dhash
+from image_store import IMAGE_STORE_DIR, image_store, store_image
+from stage_timing import StageTimer, detect_stage_seconds, record_detection
+from detection_jobs import job_queue, enqueue_job, queue_stats, QueueFullError
 from auth import (
     authenticate_user, create_access_token, get_current_active_user,
     get_current_super_admin, get_current_officer, get_current_cashier,
@@ -32,10 +45,47 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Largest binary frame accepted on the live camera WebSocket
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", str(4 * 1024 * 1024)))
+
+# Load OCR engines and registry indexes at startup instead of on the first detections
+WARM_UP = os.getenv("WARM_UP", "true").lower() == "true"
+
+# Batch detection limits
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "100"))
+# Largest image accepted, uploaded directly or inside a zip archive
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+BATCH_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp")
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
+
+@app.on_event("startup")
+async def start_detection_workers():
+    if CACHE_SYNC:
+        # Changes made from here on are applied even if they race with the warm-up
+        await run_in_threadpool(cache_sync.start)
+        app.state.sync_task = asyncio.create_task(sync_loop())
+    if WARM_UP:
+        start = time.perf_counter()
+        warmed = await run_in_threadpool(warm_up)
+        print(f"Worker {os.getpid()} warmed up in {time.perf_counter() - start:.1f}s: {warmed}")
+    await job_queue.start()
+    if LOG_RETENTION_DAYS > 0:
+        app.state.retention_task = asyncio.create_task(retention_loop())
+
+@app.on_event("shutdown")
+async def stop_detection_workers():
+    await job_queue.stop()
+    for name in ("retention_task", "sync_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    # Finish writing queued evidence images and detection logs
+    await run_in_threadpool(image_store.flush)
+    await run_in_threadpool(log_writer.close)
 
 # ==================== Authentication Endpoints ====================
 
@@ -333,8 +383,7 @@ async def create_violation(
     # Handle plate number if provided
     vehicle_id = None
     if 'plate_number' in violation_data:
-        plate_number = violation_data['plate_number']
-        vehicle = db.query(Vehicle).filter(Vehicle.plate_number == plate_number).first()
+        vehicle = find_vehicle_by_plate(db, violation_data['plate_number'])
         if vehicle:
             vehicle_id = vehicle.id
     elif 'vehicle_id' in violation_data:
@@ -405,7 +454,7 @@ async def list_violations(
     status: Optional[schemas.ViolationStatus] = None,
     vehicle_id: Optional[int] = None,
     officer_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List violations with filters"""
@@ -434,7 +483,7 @@ async def list_violations(
 @app.get("/api/violations/{violation_id}", response_model=schemas.Violation)
 async def get_violation(
     violation_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get specific violation details"""
@@ -457,7 +506,7 @@ async def get_violation(
 @app.get("/api/violations/ticket/{ticket_number}", response_model=schemas.Violation)
 async def get_violation_by_ticket(
     ticket_number: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get violation by ticket number (public endpoint for payment lookup)"""
     violation = db.query(Violation).filter(Violation.ticket_number == ticket_number).first()
@@ -561,7 +610,7 @@ async def list_appeals(
     skip: int = 0,
     limit: int = 100,
     status: Optional[schemas.AppealStatus] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_super_admin)
 ):
     """List all appeals (Super Admin only)"""
@@ -691,7 +740,7 @@ async def list_payments(
     cashier_id: Optional[int] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List payments with filters"""
@@ -720,7 +769,7 @@ async def list_payments(
 @app.get("/api/payments/{payment_id}", response_model=schemas.Payment)
 async def get_payment(
     payment_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get specific payment details"""
@@ -743,7 +792,7 @@ async def get_payment(
 @app.get("/api/violations/{violation_id}/payments", response_model=List[schemas.Payment])
 async def get_violation_payments(
     violation_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all payments for a specific violation"""
@@ -763,7 +812,7 @@ async def get_violation_payments(
 async def get_dashboard_statistics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get dashboard statistics based on user role"""
@@ -822,73 +871,12 @@ async def get_dashboard_statistics(
 
 # ==================== Existing Routes ====================
 
-def normalize_plate_number(plate):
-    """Normalize plate number by removing spaces, hyphens, and converting to uppercase"""
-    if not plate:
-        return ""
-    # Remove all non-alphanumeric characters and convert to uppercase
-    normalized = re.sub(r'[^A-Za-z0-9]', '', plate).upper()
-    return normalized
-
-def preprocess_image(image):
-    """Preprocess image for better OCR accuracy"""
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Simple preprocessing - just return grayscale for now
-    # This will help us debug if the complex preprocessing is the issue
-    return gray
-
-def extract_plate_number(text):
-    """Extract likely license plate patterns from OCR text"""
-    # Clean the text
-    text = text.upper().strip()
-    
-    # Remove common OCR artifacts
-    text = text.replace('|', 'I')
-    text = text.replace('0', 'O')
-    text = text.replace('$', 'S')
-    text = text.replace('&', '8')
-    
-    # Common license plate patterns
-    patterns = [
-        r'[A-Z]{2,3}[-\s]?\d{3,4}',  # AB-1234 or ABC-123
-        r'\d{2,3}[-\s]?[A-Z]{2,3}[-\s]?\d{2,4}',  # 12-ABC-34
-        r'[A-Z]{1,3}\d{1,4}[A-Z]{0,3}',  # A123B or ABC1234
-        r'\d{1,4}[A-Z]{1,3}\d{0,4}',  # 1234ABC
-        r'[A-Z0-9]{4,10}',  # General alphanumeric
-    ]
-    
-    candidates = []
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        candidates.extend(matches)
-    
-    # Filter candidates by length (most plates are 5-8 characters)
-    candidates = [c for c in candidates if 4 <= len(c.replace('-', '').replace(' ', '')) <= 10]
-    
-    # Add hyphenated versions for common patterns
-    additional_candidates = []
-    for c in candidates:
-        # If it looks like ABC1234, also try ABC-1234
-        if re.match(r'^[A-Z]{3}\d{4}$', c):
-            additional_candidates.append(f"{c[:3]}-{c[3:]}")
-        # If it looks like AB1234, also try AB-1234
-        elif re.match(r'^[A-Z]{2}\d{4}$', c):
-            additional_candidates.append(f"{c[:2]}-{c[2:]}")
-    
-    candidates.extend(additional_candidates)
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_candidates = []
-    for c in candidates:
-        if c not in seen:
-            seen.add(c)
-            unique_candidates.append(c)
-    
-    return unique_candidates
+def find_vehicle_by_plate(db: Session, plate):
+    """Look up a vehicle by plate number using the indexed normalized plate column"""
+    normalized = normalize_plate_number(plate)
+    if not normalized:
+        return None
+    return db.query(Vehicle).filter(Vehicle.normalized_plate == normalized).first()
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -963,7 +951,7 @@ async def create_owner(owner: schemas.OwnerCreate, db: Session = Depends(get_db)
     return db_owner
 
 @app.get("/api/owners")
-async def get_owners(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_owners(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     owners = db.query(Owner).offset(skip).limit(limit).all()
     # Add vehicles to each owner
     result = []
@@ -1003,8 +991,8 @@ async def create_vehicle(vehicle: schemas.VehicleCreate, db: Session = Depends(g
     vehicle_data = vehicle.dict()
     vehicle_data['plate_number'] = vehicle_data['plate_number'].upper()
     
-    # Check if plate already exists
-    existing = db.query(Vehicle).filter(Vehicle.plate_number == vehicle_data['plate_number']).first()
+    # Check if plate already exists (ABC-1234 and ABC1234 are the same plate)
+    existing = find_vehicle_by_plate(db, vehicle_data['plate_number'])
     if existing:
         raise HTTPException(status_code=400, detail="Plate number already registered")
     
@@ -1015,50 +1003,157 @@ async def create_vehicle(vehicle: schemas.VehicleCreate, db: Session = Depends(g
     return db_vehicle
 
 @app.get("/api/vehicles/{plate_number}", response_model=schemas.Vehicle)
-async def get_vehicle(plate_number: str, db: Session = Depends(get_db)):
-    vehicle = db.query(Vehicle).filter(Vehicle.plate_number == plate_number.upper()).first()
+async def get_vehicle(plate_number: str, db: Session = Depends(get_read_db)):
+    vehicle = find_vehicle_by_plate(db, plate_number)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     return vehicle
 
 @app.get("/api/detection-logs", response_model=List[schemas.DetectionLog])
-async def get_detection_logs(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+async def get_detection_logs(skip: int = 0, limit: int = 50, db: Session = Depends(get_read_db)):
     logs = db.query(DetectionLog).order_by(DetectionLog.detected_at.desc()).offset(skip).limit(limit).all()
     return logs
 
+@app.get("/api/detection-logs/history", response_model=List[schemas.ArchivedDetectionLog])
+async def get_detection_log_history(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    plate: Optional[str] = None,
+    source: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Detection logs including archived months, newest first"""
+    return await run_in_threadpool(query_logs, db, start, end, plate, source, skip, min(limit, 1000))
+
+@app.get("/api/log-archive/stats")
+async def get_log_archive_stats(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_super_admin)):
+    """Live detection log count and archived monthly partitions (Super Admin only)"""
+    return await run_in_threadpool(archive_stats, db)
+
+# Content types of stored evidence images, by extension
+IMAGE_MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "bmp": "image/bmp", "webp": "image/webp"}
+
+def stored_log_image(db: Session, log_id: int) -> str:
+    """Stored image path of a detection log (live or archived), or 404"""
+    log = get_log(db, log_id)
+    if not log or not log["image_path"]:
+        raise HTTPException(status_code=404, detail="No image stored for this detection")
+    return log["image_path"]
+
+@app.get("/api/detection-logs/{log_id}/image")
+async def get_detection_image(
+    log_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Original image a detection was read from"""
+    image_path = await run_in_threadpool(stored_log_image, db, log_id)
+    contents = await run_in_threadpool(image_store.read, image_path)
+    if contents is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(
+        contents,
+        media_type=IMAGE_MEDIA_TYPES[image_path.rsplit(".", 1)[1]],
+        # Content-addressed: a stored path always holds the same bytes
+        headers={"Cache-Control": "private, max-age=31536000, immutable"}
+    )
+
+@app.get("/api/detection-logs/{log_id}/thumbnail")
+async def get_detection_thumbnail(
+    log_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """JPEG thumbnail of a detection's image, generated on first view"""
+    image_path = await run_in_threadpool(stored_log_image, db, log_id)
+    thumbnail = await run_in_threadpool(image_store.thumbnail, image_path)
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(thumbnail, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
+@app.get("/api/image-store/stats")
+async def get_image_store_stats(current_user: User = Depends(get_current_super_admin)):
+    """Evidence image store write/dedupe counters (Super Admin only)"""
+    return image_store.stats()
+
+@app.get("/api/log-writer/stats")
+async def get_log_writer_stats(current_user: User = Depends(get_current_super_admin)):
+    """Detection log write-behind buffer depth, flush and overflow counters (Super Admin only)"""
+    return log_writer.stats()
+
+@app.get("/api/hotlist")
+async def get_hotlist(current_user: User = Depends(get_current_officer)):
+    """Every flagged plate with its reasons and outstanding amount (Officers and Super Admins)"""
+    alerts = await run_in_threadpool(hotlist.alerts)
+    return sorted(alerts, key=lambda alert: alert["outstanding_amount"], reverse=True)
+
+@app.get("/api/hotlist/stats")
+async def get_hotlist_stats(current_user: User = Depends(get_current_super_admin)):
+    """Hotlist size and incremental update count (Super Admin only)"""
+    return hotlist.stats()
+
+@app.get("/api/registry-cache/stats")
+async def get_registry_cache_stats(current_user: User = Depends(get_current_super_admin)):
+    """Plate registry cache hit/miss counters (Super Admin only)"""
+    return registry_cache.stats()
+
+@app.get("/api/ocr-cache/stats")
+async def get_ocr_cache_stats(current_user: User = Depends(get_current_super_admin)):
+    """OCR result cache hit/miss counters (Super Admin only)"""
+    return {**ocr_cache.stats(), "near_duplicate_frames": frame_index.stats()}
+
+@app.get("/api/cache-sync/stats")
+async def get_cache_sync_stats(current_user: User = Depends(get_current_super_admin)):
+    """Cache changes this worker published to and applied from other workers (Super Admin only)"""
+    return cache_sync.stats()
+
+async def read_upload(upload: UploadFile, limit: int = MAX_UPLOAD_SIZE) -> bytes:
+    """Read an uploaded file into memory, rejecting it with 413 once it passes `limit` bytes"""
+    contents = await upload.read(limit + 1)
+    if len(contents) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{upload.filename or 'Upload'} is too large (max {limit} bytes)"
+        )
+    return contents
+
+def timed_detection_response(payload: dict, timer: StageTimer, source: str, include_timings: bool) -> JSONResponse:
+    """Record a detection's stage timings and attach them as a Server-Timing header (and optionally the body)
+
+    Failed detections are recorded too, under outcome="error" in /metrics.
+    """
+    timings = record_detection(timer, source or "unknown", "success" if payload.get("success") else "error")
+    if include_timings:
+        payload["timings"] = timings
+    return JSONResponse(payload, headers={"Server-Timing": timer.server_timing(timings)})
+
 @app.post("/detect")
 async def detect_plate(
+    request: Request,
     file: Optional[UploadFile] = File(None),
     image_data: Optional[str] = Form(None),
     manual_plate: Optional[str] = Form(None),
+    camera_id: Optional[str] = Form(None),
+    timings: bool = False,
     db: Session = Depends(get_db)
 ):
+    timer = StageTimer()
+    source = None
     try:
         if manual_plate:
             # Check database for manual input too
             plate_upper = manual_plate.upper()
-            normalized_input = normalize_plate_number(manual_plate)
-            
-            # Query database - try to find vehicles where normalized plate matches
-            all_vehicles = db.query(Vehicle).all()
-            vehicle = None
-            for v in all_vehicles:
-                normalized_db = normalize_plate_number(v.plate_number)
-                if normalized_db == normalized_input:
-                    vehicle = v
-                    break
-            
+            with timer.stage("match"):
+                vehicle = await run_in_threadpool(lookup_vehicle, db, manual_plate)
+                # The hotlist reloads itself once a day
+                alert = await run_in_threadpool(hotlist.alert, vehicle['plate_number']) if vehicle else None
             
             # Log the detection
-            detection_log = DetectionLog(
-                plate_number=plate_upper,
-                detected_text=plate_upper,
-                confidence=100,
-                source="manual",
-                vehicle_id=vehicle.id if vehicle else None
-            )
-            db.add(detection_log)
-            db.commit()
+            with timer.stage("log"):
+                log_writer.add([detection_log_row({"text": plate_upper, "confidence": 100}, vehicle, "manual")])
             
             result = {
                 "text": plate_upper,
@@ -1066,39 +1161,25 @@ async def detect_plate(
             }
             
             if vehicle:
-                result['vehicle_info'] = {
-                    "make": vehicle.make,
-                    "model": vehicle.model,
-                    "year": vehicle.year,
-                    "color": vehicle.color,
-                    "status": vehicle.status,
-                    "owner": {
-                        "name": f"{vehicle.owner.first_name} {vehicle.owner.last_name}",
-                        "email": vehicle.owner.email,
-                        "phone": vehicle.owner.phone,
-                        "city": vehicle.owner.city,
-                        "state": vehicle.owner.state
-                    }
-                }
+                result['vehicle_info'] = vehicle['vehicle_info']
+                if alert:
+                    result['alert'] = alert
             
-            return JSONResponse({
+            return timed_detection_response({
                 "success": True,
                 "plates": [result],
-                "source": "manual"
-            })
+                "source": "manual",
+                "alerts": [result['alert']] if 'alert' in result else []
+            }, timer, "manual", timings)
         
         image = None
         
         if file:
-            contents = await file.read()
-            nparr = np.frombuffer(contents, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            contents = await read_upload(file)
             source = "upload"
         elif image_data:
-            image_data = image_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            img = Image.open(io.BytesIO(image_bytes))
-            image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+            # Camera frames are JPEG data URLs; decode straight to BGR
+            contents = decode_data_url(image_data)
             source = "camera"
         else:
             return JSONResponse({
@@ -1106,116 +1187,317 @@ async def detect_plate(
                 "error": "No image or manual input provided"
             })
         
+        with timer.stage("decode"):
+            image = await run_in_threadpool(decode_image, contents)
+        
         if image is None:
-            return JSONResponse({
+            return timed_detection_response({
                 "success": False,
                 "error": "Failed to process image"
-            })
+            }, timer, source, timings)
         
-        # Preprocess the image
-        processed_image = preprocess_image(image)
+        # Keep the image as evidence while OCR runs; the file itself is
+        # written in the background
+        store_task = asyncio.ensure_future(run_in_threadpool(store_image, contents))
         
-        # Run OCR with different configurations
-        configs = [
-            '--psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-            '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-            '--psm 13',
-            '--psm 11',
-        ]
+        # Run the OCR pipeline, reusing the result of a near-identical
+        # frame recently sent by the same camera
+        camera_key = camera_id or (request.client.host if request.client else "")
+        if source == "camera" and FRAME_DEDUPE:
+            with timer.stage("dedupe"):
+                frame_hash = await run_in_threadpool(dhash, image)
+                plates, passes_run = frame_index.lookup(camera_key, frame_hash), 0
+            if plates is None:
+                plates, passes_run, failed = await read_plate_candidates(image, timer)
+                if not failed:
+                    frame_index.remember(camera_key, frame_hash, plates)
+        else:
+            plates, passes_run, _ = await read_plate_candidates(image, timer)
         
-        all_text = []
-        for config in configs:
-            try:
-                text = pytesseract.image_to_string(processed_image, config=config)
-                all_text.append(text)
-            except Exception as e:
-                pass
+        # Check database for vehicle info and log detections
+        image_path = await store_task
+        with timer.stage("match"):
+            results_with_info = await run_in_threadpool(log_plate_results, db, plates, source,
+                                                        image_path=image_path, source_key=camera_key)
         
-        # Combine all OCR results
-        combined_text = ' '.join(all_text)
+        return timed_detection_response({
+            "success": True,
+            "plates": results_with_info,
+            "source": source,
+            "passes_run": passes_run,
+            # Flagged vehicles among the plates, for clients that only need to raise an alarm
+            "alerts": [plate['alert'] for plate in results_with_info if 'alert' in plate]
+        }, timer, source, timings)
         
-        # Extract plate numbers
-        plate_candidates = extract_plate_number(combined_text)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return timed_detection_response({
+            "success": False,
+            "error": str(e)
+        }, timer, source, timings)
+
+@app.get("/metrics")
+async def metrics():
+    """Detection stage latency histograms in the Prometheus text format"""
+    return PlainTextResponse(detect_stage_seconds.render(), media_type="text/plain; version=0.0.4")
+
+@app.websocket("/ws/detect")
+async def detect_live(websocket: WebSocket, camera_id: Optional[str] = None):
+    """Live camera detection over a WebSocket
+
+    The client sends binary JPEG frames and gets one JSON result per frame
+    that was read. While OCR is busy only the newest frame is kept, older
+    ones are dropped, so results never lag behind the camera.
+    """
+    await websocket.accept()
+    camera_key = camera_id or (websocket.client.host if websocket.client else "")
+    latest = {"frame": None, "seq": 0}
+    frame_ready = asyncio.Event()
+    dropped = 0
+    
+    async def receive_frames():
+        nonlocal dropped
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            # Only binary frames are images; ignore text and oversized frames
+            frame = message.get("bytes")
+            if not frame or len(frame) > LIVE_MAX_FRAME_BYTES:
+                continue
+            if latest["frame"] is not None:
+                dropped += 1
+            latest["frame"] = frame
+            latest["seq"] += 1
+            frame_ready.set()
+    
+    def match_frame(plates):
+        """(plate, vehicle, payload) for the top candidates; queries the registry on a cache miss
         
-        # Also try OCR on the original image
+        Each frame gets its own session, so an open connection holds no
+        pooled connection or stale read snapshot between frames.
+        """
+        db = SessionLocal()
         try:
-            text = pytesseract.image_to_string(image)
-            more_candidates = extract_plate_number(text)
-            plate_candidates.extend(more_candidates)
-        except Exception as e:
-            pass
-        
-        # Remove duplicates and create results
-        seen = set()
-        plates = []
-        for plate in plate_candidates:
-            clean_plate = plate.replace('-', '').replace(' ', '')
-            if clean_plate not in seen and len(clean_plate) >= 4:
-                seen.add(clean_plate)
-                plates.append({
-                    "text": plate,
-                    "confidence": 85  # Tesseract doesn't provide confidence scores
-                })
-        
-        # Check database for vehicle info and log detections
-        results_with_info = []
-        for plate in plates[:3]:
-            # Look up vehicle in database using normalized plate
-            normalized_detected = normalize_plate_number(plate['text'])
-            all_vehicles = db.query(Vehicle).all()
-            vehicle = None
-            for v in all_vehicles:
-                if normalize_plate_number(v.plate_number) == normalized_detected:
-                    vehicle = v
-                    break
+            return [(plate, vehicle, plate_result(plate, vehicle, match))
+                    for plate, vehicle, match in rank_matches(db, plates)[:MAX_PLATES_PER_IMAGE]]
+        finally:
+            db.close()
+    
+    async def process_frames():
+        # Plates already logged for the previous frame are not logged again
+        # while they stay in view
+        in_view = set()
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame, seq = latest["frame"], latest["seq"]
+            latest["frame"] = None
             
-            # Log the detection
-            detection_log = DetectionLog(
-                plate_number=plate['text'].upper(),
-                detected_text=plate['text'],
-                confidence=plate['confidence'],
-                source=source,
-                vehicle_id=vehicle.id if vehicle else None
-            )
-            db.add(detection_log)
+            started = time.perf_counter()
+            image = await run_in_threadpool(decode_image, frame)
+            if image is None:
+                await websocket.send_json({"frame": seq, "success": False, "error": "Failed to process image"})
+                continue
             
-            # Prepare result with owner info if found
-            result = {
-                "text": plate['text'],
-                "confidence": plate['confidence']
-            }
+            frame_hash = await run_in_threadpool(dhash, image) if FRAME_DEDUPE else None
+            plates = frame_index.lookup(camera_key, frame_hash) if FRAME_DEDUPE else None
+            passes_run = 0
+            if plates is None:
+                plates, passes_run, failed = await read_plate_candidates(image)
+                if FRAME_DEDUPE and not failed:
+                    frame_index.remember(camera_key, frame_hash, plates)
             
-            if vehicle:
-                result['vehicle_info'] = {
-                    "make": vehicle.make,
-                    "model": vehicle.model,
-                    "year": vehicle.year,
-                    "color": vehicle.color,
-                    "status": vehicle.status,
-                    "owner": {
-                        "name": f"{vehicle.owner.first_name} {vehicle.owner.last_name}",
-                        "email": vehicle.owner.email,
-                        "phone": vehicle.owner.phone,
-                        "city": vehicle.owner.city,
-                        "state": vehicle.owner.state
-                    }
-                }
+            results = []
+            rows = []
+            seen = set()
+            image_path = None
+            for plate, vehicle, result in await run_in_threadpool(match_frame, plates):
+                normalized = normalize_plate_number(plate['text'])
+                seen.add(normalized)
+                if normalized not in in_view:
+                    # Only frames that get logged are kept as evidence
+                    if image_path is None:
+                        image_path = await run_in_threadpool(store_image, frame)
+                    rows.append(detection_log_row(plate, vehicle, "live", image_path))
+                results.append(result)
+            log_writer.add(rows, camera_key)
+            in_view = seen
             
-            results_with_info.append(result)
-        
-        db.commit()
+            await websocket.send_json({
+                "frame": seq,
+                "success": True,
+                "plates": results,
+                "source": "live",
+                "passes_run": passes_run,
+                "dropped": dropped,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+    
+    receiver = asyncio.create_task(receive_frames())
+    processor = asyncio.create_task(process_frames())
+    try:
+        # Either side ends the session: the client disconnecting or a send failing
+        done, _ = await asyncio.wait({receiver, processor}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"Live detection error: {task.exception()}")
+    finally:
+        receiver.cancel()
+        processor.cancel()
+        await asyncio.gather(receiver, processor, return_exceptions=True)
+
+def expand_batch_upload(filename: str, contents: bytes):
+    """Yield (name, bytes) for an uploaded image, or for every image inside a zip archive
+
+    Zip entries are only decompressed when their declared size is within
+    MAX_UPLOAD_SIZE (zipfile never reads past the declared size).
+    """
+    if not (filename or "").lower().endswith(".zip"):
+        yield filename, contents
+        return
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        for entry in archive.infolist():
+            if not entry.is_dir() and entry.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                if entry.file_size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"{entry.filename} is too large (max {MAX_UPLOAD_SIZE} bytes)"
+                    )
+                yield entry.filename, archive.read(entry)
+
+@app.post("/detect/batch")
+async def detect_plate_batch(files: List[UploadFile] = File(...)):
+    """Detect plates in many images (or zip archives of images) in one request
+
+    Images are read in parallel and each result is streamed back as one
+    NDJSON line as soon as that image finishes. Detection logs go through
+    the write-behind log writer; the final line reports how many were logged.
+    """
+    images = []
+    try:
+        for upload in files:
+            # An archive may hold up to BATCH_MAX_IMAGES images of the largest size
+            is_archive = (upload.filename or "").lower().endswith(".zip")
+            contents = await read_upload(upload, MAX_UPLOAD_SIZE * (BATCH_MAX_IMAGES if is_archive else 1))
+            for image in expand_batch_upload(upload.filename, contents):
+                # Stop before decompressing anything past the limit
+                if len(images) >= BATCH_MAX_IMAGES:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Too many images in one batch (max {BATCH_MAX_IMAGES})"
+                    )
+                images.append(image)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+    
+    if not images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    
+    # Keep only as many decoded images in memory as the OCR pool can work on
+    in_flight = asyncio.Semaphore(OCR_WORKERS)
+    
+    async def process(index, filename, contents):
+        """Returns (index, filename, plates, passes_run, image_path, error)"""
+        async with in_flight:
+            try:
+                image = await run_in_threadpool(decode_image, contents)
+                if image is None:
+                    return index, filename, None, 0, None, "Failed to process image"
+                # Only images that decode are kept as evidence
+                image_path = await run_in_threadpool(store_image, contents)
+                plates, passes_run, _ = await read_plate_candidates(image)
+                return index, filename, plates, passes_run, image_path, None
+            except Exception as e:
+                return index, filename, None, 0, None, str(e)
+    
+    def log_image(plates, image_path):
+        """Match and log one image's candidates; all of them come from the registry cache or one bulk query
         
-        return JSONResponse({
-            "success": True,
-            "plates": results_with_info,
-            "source": source
-        })
+        Each image gets its own session rather than one held open while the
+        whole batch streams.
+        """
+        db = SessionLocal()
+        try:
+            exact = lookup_vehicles(db, [plate['text'] for plate in plates])
+            return log_plate_results(db, plates, "batch", exact, image_path)
+        finally:
+            db.close()
+    
+    async def stream_results():
+        logged = 0
+        tasks = [process(i, name, contents) for i, (name, contents) in enumerate(images)]
+        for finished in asyncio.as_completed(tasks):
+            index, filename, plates, passes_run, image_path, error = await finished
+            if error is not None:
+                yield json.dumps({
+                    "index": index,
+                    "filename": filename,
+                    "success": False,
+                    "error": error
+                }) + "\n"
+                continue
+            
+            results = await run_in_threadpool(log_image, plates, image_path)
+            logged += len(results)
+            
+            yield json.dumps({
+                "index": index,
+                "filename": filename,
+                "success": True,
+                "plates": results,
+                "passes_run": passes_run
+            }) + "\n"
         
-    except Exception as e:
-        return JSONResponse({
-            "success": False,
-            "error": str(e)
-        })
+        yield json.dumps({"done": True, "images": len(images), "logged": logged}) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# ==================== Detection Jobs ====================
+
+# Longest a client may long-poll a job in one request
+JOB_MAX_WAIT_SECONDS = 30
+
+@app.post("/detect/jobs", status_code=202)
+async def submit_detection_job(
+    file: Optional[UploadFile] = File(None),
+    image_data: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Queue an image for detection and return its job id immediately"""
+    if file:
+        contents = await read_upload(file)
+        source = "upload"
+    elif image_data:
+        contents = decode_data_url(image_data)
+        source = "camera"
+    else:
+        raise HTTPException(status_code=400, detail="No image provided")
+    
+    try:
+        job = await run_in_threadpool(enqueue_job, db, contents, source)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Detection queue is full, retry later",
+            headers={"Retry-After": "5"}
+        )
+    
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/detect/jobs/stats")
+async def get_detection_job_stats(db: Session = Depends(get_db)):
+    """Queue depth and age of the oldest waiting job"""
+    return await run_in_threadpool(queue_stats, db)
+
+@app.get("/detect/jobs/{job_id}")
+async def get_detection_job(job_id: str, wait: float = 0):
+    """Get a detection job; with `wait` (seconds) the request blocks until it finishes"""
+    job = await job_queue.wait(job_id, min(max(wait, 0), JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Detection job not found")
+    return job
 
 if __name__ == "__main__":
     import uvicorn
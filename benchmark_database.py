@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite reads under concurrent detection log writes
+Runs writer threads bulk-inserting detection logs (as the log writer
+does) next to reader threads running the detection log listing and a
+dashboard-style count, first with the old engine settings (rollback
+journal, synchronous=FULL, one pool) and then with the tuned ones from
+database.py (WAL, synchronous=NORMAL, mmap, larger page cache, busy
+timeout, separate read-only pool), e.g.
+
+    python benchmark_database.py --seconds 10 --readers 8 --writers 2
+
+Each configuration gets a fresh database in a temporary directory.
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import OperationalError
+from database import Base, DetectionLog, SQLITE_PRAGMAS, create_database_engine
+from benchmark_pipeline import summarize
+
+# The engine settings before they became configurable
+LEGACY_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+SOURCES = ["upload", "camera", "live", "video"]
+
+def log_rows(count: int, start: datetime):
+    return [{
+        "plate_number": f"BEN{random.randint(0, 99999):05d}",
+        "detected_text": "BENCH",
+        "confidence": random.uniform(50, 99),
+        "source": random.choice(SOURCES),
+        "detected_at": start + timedelta(seconds=i),
+        "hit_count": 1
+    } for i in range(count)]
+
+def recent_logs(conn):
+    """GET /api/detection-logs"""
+    table = DetectionLog.__table__
+    return conn.execute(select(table).order_by(table.c.detected_at.desc()).limit(50)).all()
+
+def logs_per_source(conn):
+    """A dashboard-style aggregate over the whole table"""
+    table = DetectionLog.__table__
+    return conn.execute(select(table.c.source, func.count()).group_by(table.c.source)).all()
+
+def run_configuration(name: str, tuned: bool, rows: int, seconds: float, readers: int, writers: int,
+                      batch: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        pragmas = SQLITE_PRAGMAS if tuned else LEGACY_PRAGMAS
+        write_engine = create_database_engine(url, pragmas=pragmas)
+        read_engine = create_database_engine(url, read_only=True, pragmas=pragmas) if tuned else write_engine
+        Base.metadata.create_all(bind=write_engine, tables=[DetectionLog.__table__])
+        with write_engine.begin() as conn:
+            conn.execute(insert(DetectionLog.__table__), log_rows(rows, datetime(2024, 1, 1)))
+
+        read_ms, write_ms = [], []
+        errors = {"read": 0, "write": 0}
+        lock = threading.Lock()
+        stop = time.monotonic() + seconds
+
+        def reader(index: int):
+            timings = []
+            failed = 0
+            queries = [recent_logs, logs_per_source]
+            i = index
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    with read_engine.connect() as conn:
+                        queries[i % len(queries)](conn)
+                except OperationalError:
+                    failed += 1
+                    continue
+                finally:
+                    i += 1
+                timings.append((time.perf_counter() - start) * 1000)
+            with lock:
+                read_ms.extend(timings)
+                errors["read"] += failed
+
+        def writer(index: int):
+            timings = []
+            failed = 0
+            while time.monotonic() < stop:
+                batch_rows = log_rows(batch, datetime.utcnow())
+                start = time.perf_counter()
+                try:
+                    with write_engine.begin() as conn:
+                        conn.execute(insert(DetectionLog.__table__), batch_rows)
+                except OperationalError:
+                    failed += 1
+                    continue
+                timings.append((time.perf_counter() - start) * 1000)
+            with lock:
+                write_ms.extend(timings)
+                errors["write"] += failed
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        write_engine.dispose()
+        read_engine.dispose()
+
+    return {
+        "name": name,
+        "reads_per_second": round(len(read_ms) / elapsed, 1),
+        "rows_written_per_second": round(len(write_ms) * batch / elapsed, 1),
+        "read": summarize(read_ms) if read_ms else None,
+        "write": summarize(write_ms) if write_ms else None,
+        "read_errors": errors["read"],
+        "write_errors": errors["write"]
+    }
+
+def print_report(report: dict):
+    print(f"{report['rows']} rows, {report['readers']} readers, {report['writers']} writers "
+          f"({report['batch']} rows per commit), {report['seconds']}s each\n")
+    print(f"{'settings':<8} {'reads/s':>9} {'read p50':>9} {'read p95':>9} {'read max':>9} "
+          f"{'rows/s':>9} {'write p95':>10} {'errors':>7}")
+    for result in report["results"]:
+        read = result["read"] or {"p50_ms": 0, "p95_ms": 0, "max_ms": 0}
+        write = result["write"] or {"p95_ms": 0}
+        print(f"{result['name']:<8} {result['reads_per_second']:9.1f} {read['p50_ms']:9.2f} {read['p95_ms']:9.2f} "
+              f"{read['max_ms']:9.2f} {result['rows_written_per_second']:9.1f} {write['p95_ms']:10.2f} "
+              f"{result['read_errors'] + result['write_errors']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite read latency under writes for the old and tuned engine settings")
+    parser.add_argument("--rows", type=int, default=50000, help="Detection logs in the table before the run")
+    parser.add_argument("--seconds", type=float, default=10, help="Run time per configuration")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=200, help="Rows per write transaction")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "cpu_count": os.cpu_count(),
+        "rows": args.rows,
+        "seconds": args.seconds,
+        "readers": args.readers,
+        "writers": args.writers,
+        "batch": args.batch,
+        "results": [
+            run_configuration(name, tuned, args.rows, args.seconds, args.readers, args.writers, args.batch)
+            for name, tuned in (("legacy", False), ("tuned", True))
+        ]
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark image decoding and normalization
+Compares the old full-resolution decode paths (cv2.imdecode for uploads,
+PIL -> numpy -> BGR for camera frames) with detection.decode_image, which
+decodes oversized JPEGs at reduced resolution and caps the working size.
+Reports time and peak traced memory per image, including grayscale
+preprocessing, e.g.
+
+    python benchmark_decode.py --repeat 5
+
+Besides the sample images as-is, each one is also upscaled into a 12MP
+(4000x3000) JPEG to stand in for a phone photo.
+"""
+
+import io
+import argparse
+import statistics
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+from benchmark_ocr import DEFAULT_IMAGES
+from detection import MAX_IMAGE_DIMENSION, decode_image, preprocess_image
+
+PHONE_PHOTO_SIZE = (4000, 3000)
+
+def legacy_upload(contents):
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    return image, preprocess_image(image)
+
+def legacy_camera(contents):
+    img = Image.open(io.BytesIO(contents))
+    image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    return image, preprocess_image(image)
+
+def normalized(contents):
+    image = decode_image(contents)
+    return image, preprocess_image(image)
+
+PATHS = [
+    ("upload (full decode)", legacy_upload),
+    ("camera (PIL + copies)", legacy_camera),
+    ("decode_image (bounded)", normalized),
+]
+
+def load_inputs(paths):
+    """Encoded test inputs: each sample as-is plus a 12MP JPEG version"""
+    inputs = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        with open(path, "rb") as f:
+            inputs.append((path, f.read()))
+        photo = cv2.resize(image, PHONE_PHOTO_SIZE, interpolation=cv2.INTER_CUBIC)
+        inputs.append((f"{path} @ {PHONE_PHOTO_SIZE[0]}x{PHONE_PHOTO_SIZE[1]}",
+                       cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()))
+    return inputs
+
+def measure(func, contents, repeat):
+    """Median ms and peak traced MB for func(contents)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(contents)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    image, _ = func(contents)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1e6, image.shape
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image decoding and normalization")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="Images to decode")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per path and image")
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.images)
+    print(f"Working size capped at {MAX_IMAGE_DIMENSION}px, {args.repeat} runs per path\n")
+    print(f"{'image':<40} {'path':<24} {'p50 ms':>8} {'peak MB':>8}  working size")
+    for name, contents in inputs:
+        for label, func in PATHS:
+            ms, peak, shape = measure(func, contents, args.repeat)
+            print(f"{name[-40:]:<40} {label:<24} {ms:8.1f} {peak:8.1f}  {shape[1]}x{shape[0]}")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark OCR backends on the sample images
+Reports per-pass latency for every available backend, e.g.
+
+    python benchmark_ocr.py --repeat 5
+    python benchmark_ocr.py --backend pytesseract --images test_plate.png
+
+With --localization it also compares whole-frame OCR against OCR on the
+localized plate crops, using the sample plates pasted into full-size
+synthetic camera frames.
+"""
+
+import argparse
+import glob
+import statistics
+import time
+import cv2
+import numpy as np
+from detection import preprocess_image
+from ocr import OCR_BACKENDS, OCR_CONFIGS, ROI_OCR_CONFIGS, tesserocr
+from plate_localization import locate_plates
+
+DEFAULT_IMAGES = sorted(glob.glob("sample/*.jpg") + glob.glob("sample/*.png")) + ["test_plate.png"]
+
+def load_images(paths):
+    """Load and preprocess the benchmark images"""
+    images = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        images.append((path, image, preprocess_image(image)))
+    return images
+
+def benchmark_backend(backend, images, repeat):
+    """Time every pass of the /detect pipeline on every image, in milliseconds"""
+    passes = [(config, True) for config in OCR_CONFIGS] + [("(original image)", False)]
+    timings = {label: [] for label, _ in passes}
+
+    for _, image, processed in images:
+        for label, on_processed in passes:
+            config = label if on_processed else ""
+            target = processed if on_processed else image
+            # First call warms up the engine (model load for persistent backends)
+            backend.image_to_data(target, config=config)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                backend.image_to_data(target, config=config)
+                timings[label].append((time.perf_counter() - start) * 1000)
+    return timings
+
+def make_camera_frame(plate, size=(1920, 1080), seed=0):
+    """Paste a plate crop into a noisy full-HD frame, roughly like a roadside camera shot"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    frame = rng.normal(110, 35, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    frame = cv2.GaussianBlur(frame, (7, 7), 0)
+    h, w = plate.shape[:2]
+    x, y = (width - w) // 2, (height - h) * 2 // 3
+    cv2.rectangle(frame, (x - 6, y - 6), (x + w + 6, y + h + 6), (20, 20, 20), 6)
+    frame[y:y + h, x:x + w] = plate
+    return frame
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, elapsed ms)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def benchmark_localization(backend, images, repeat):
+    """Per-stage timings for whole-frame OCR vs OCR on localized plate crops"""
+    stages = {"preprocess": [], "localize": [], "ocr (localized crops)": [], "ocr (whole frame)": []}
+    found = 0
+    for path, plate, _ in images:
+        frame = make_camera_frame(plate)
+        for _ in range(repeat):
+            processed, ms = timed(preprocess_image, frame)
+            stages["preprocess"].append(ms)
+            regions, ms = timed(locate_plates, processed)
+            stages["localize"].append(ms)
+
+            crop_ms = 0.0
+            for region in regions:
+                for config in ROI_OCR_CONFIGS:
+                    crop_ms += timed(backend.image_to_data, region, config=config)[1]
+            stages["ocr (localized crops)"].append(crop_ms)
+
+            frame_ms = sum(timed(backend.image_to_data, processed, config=config)[1] for config in OCR_CONFIGS)
+            frame_ms += timed(backend.image_to_data, frame)[1]
+            stages["ocr (whole frame)"].append(frame_ms)
+        found += bool(regions)
+
+    print(f"  localization on {len(images)} synthetic 1920x1080 frames ({found} with a plate region found)")
+    print(f"  {'stage':<45} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+    for label, values in stages.items():
+        print(f"  {label:<45} {statistics.mean(values):9.1f} {statistics.median(values):9.1f} {max(values):9.1f}")
+    saved = statistics.mean(stages["ocr (whole frame)"]) - statistics.mean(stages["ocr (localized crops)"]) - statistics.mean(stages["localize"])
+    print(f"  {'OCR time saved per frame (net of localize)':<45} {saved:9.1f}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR backends")
+    parser.add_argument("--backend", choices=list(OCR_BACKENDS), action="append",
+                        help="Backend to benchmark (default: all installed)")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="Images to OCR")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per pass and image")
+    parser.add_argument("--localization", action="store_true",
+                        help="Also compare whole-frame OCR with OCR on localized plate crops")
+    args = parser.parse_args()
+
+    backends = args.backend or [name for name in OCR_BACKENDS if name != "tesserocr" or tesserocr is not None]
+    images = load_images(args.images)
+    print(f"Benchmarking {len(images)} images x {args.repeat} runs\n")
+
+    for name in backends:
+        try:
+            backend = OCR_BACKENDS[name]()
+        except Exception as e:
+            print(f"{name}: unavailable ({e})\n")
+            continue
+
+        timings = benchmark_backend(backend, images, args.repeat)
+        print(f"{name}")
+        print(f"  {'pass':<45} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+        total = 0.0
+        for label, values in timings.items():
+            mean = statistics.mean(values)
+            total += mean
+            print(f"  {label[:45]:<45} {mean:9.1f} {statistics.median(values):9.1f} {max(values):9.1f}")
+        print(f"  {'all passes (sequential)':<45} {total:9.1f}\n")
+
+        if args.localization:
+            benchmark_localization(backend, images, args.repeat)
+
+if __name__ == "__main__":
+    main()
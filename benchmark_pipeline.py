@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /detect pipeline in-process
+Runs every stage of a detection (decode, preprocess, localize, each OCR
+pass, candidate extraction, registry lookup, DB logging) over a corpus of
+the sample images, test_plate.png and synthetic plate renders, and
+reports p50/p95 latency per stage, throughput at several concurrency
+levels and peak memory, e.g.
+
+    python benchmark_pipeline.py --workers 1 2 4 --json before.json
+    python benchmark_pipeline.py --json after.json --compare before.json
+
+DB rows are inserted but rolled back, and the OCR result cache is disabled
+so every image is really read.
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import cv2
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+import ocr
+from sqlalchemy import insert
+from database import SessionLocal, DetectionLog
+from ocr_cache import ocr_cache
+from ocr import FULL_FRAME_STAGES, ROI_OCR_CONFIGS, get_backend, run_ocr_pass
+from plate_localization import PLATE_LOCALIZATION, locate_plates
+from detection import (
+    MAX_PLATES_PER_IMAGE, decode_image, preprocess_image, collect_candidates, rank_candidates,
+    meets_stop_rule, rank_matches, detection_log_row, read_plate_candidates
+)
+from benchmark_ocr import DEFAULT_IMAGES, make_camera_frame
+
+# Plates rendered for the synthetic part of the corpus (registered and not)
+SYNTHETIC_PLATES = ["ABC 1234", "XYZ 9876", "DEF 5678", "NAX 4821", "TEST123", "QRS 552"]
+
+def render_plate(text: str) -> np.ndarray:
+    """Draw a plain white plate with black characters"""
+    plate = np.full((110, 520, 3), 245, np.uint8)
+    cv2.rectangle(plate, (4, 4), (515, 105), (20, 20, 20), 4)
+    (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 2.2, 6)
+    cv2.putText(plate, text, ((520 - w) // 2, (110 + h) // 2), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (15, 15, 15), 6)
+    return plate
+
+def build_corpus(paths, synthetic: int):
+    """Encoded test images: the given files plus synthetic plate crops and camera frames"""
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            contents = f.read()
+        if decode_image(contents) is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        corpus.append((path, contents))
+
+    for i in range(synthetic):
+        text = SYNTHETIC_PLATES[i % len(SYNTHETIC_PLATES)]
+        plate = render_plate(text)
+        image = plate if i % 2 == 0 else make_camera_frame(plate, seed=i)
+        kind = "crop" if i % 2 == 0 else "frame"
+        corpus.append((f"synthetic {kind} {text}", cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()))
+    return corpus
+
+def pass_label(config: str, on_original: bool = False, roi: bool = False) -> str:
+    """Short stage name for an OCR pass"""
+    label = config.split(" -c ")[0] or "--psm 3"
+    if "whitelist" in config:
+        label += " whitelist"
+    if on_original:
+        label += " (original)"
+    return f"ocr {'roi ' if roi else ''}{label}"
+
+def timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings[stage].append((time.perf_counter() - start) * 1000)
+    return result
+
+def insert_logs(db, matches):
+    """Insert the DetectionLog rows for the top matches, as one log_writer flush would"""
+    rows = [detection_log_row(plate, vehicle, "benchmark") for plate, vehicle, _ in matches[:MAX_PLATES_PER_IMAGE]]
+    if rows:
+        db.execute(insert(DetectionLog), rows)
+
+def run_stages(contents: bytes, db, timings):
+    """Run one detection stage by stage, the same way read_plate_candidates does, recording ms per stage"""
+    start = time.perf_counter()
+    image = timed(timings, "decode", decode_image, contents)
+    processed = timed(timings, "preprocess", preprocess_image, image)
+    regions = timed(timings, "localize", locate_plates, processed) if PLATE_LOCALIZATION else []
+
+    reads = {}
+    plates = []
+    for region in regions:
+        for config in ROI_OCR_CONFIGS:
+            read = timed(timings, pass_label(config, roi=True), run_ocr_pass, region, config)
+            timed(timings, "extract", collect_candidates, reads, [read])
+    if regions:
+        plates = timed(timings, "extract", rank_candidates, reads)
+
+    if not plates:
+        for stage in FULL_FRAME_STAGES:
+            for config, on_original in stage:
+                read = timed(timings, pass_label(config, on_original), run_ocr_pass,
+                             image if on_original else processed, config)
+                timed(timings, "extract", collect_candidates, reads, [read])
+            plates = timed(timings, "extract", rank_candidates, reads)
+            if meets_stop_rule(plates):
+                break
+
+    matches = timed(timings, "registry lookup", rank_matches, db, plates)
+
+    timed(timings, "db log", insert_logs, db, matches)
+    timings["total"].append((time.perf_counter() - start) * 1000)
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+def summarize(values) -> dict:
+    return {
+        "n": len(values),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "max_ms": round(max(values), 3)
+    }
+
+def benchmark_stages(corpus, repeat: int) -> dict:
+    """Per-stage latency over the corpus and peak traced memory"""
+    timings = defaultdict(list)
+    db = SessionLocal()
+    try:
+        # Warm up the OCR engine, the registry cache and the plate indexes
+        run_stages(corpus[0][1], db, defaultdict(list))
+        tracemalloc.start()
+        for _ in range(repeat):
+            for _, contents in corpus:
+                run_stages(contents, db, timings)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        db.rollback()
+        db.close()
+    return {"stages": {stage: summarize(values) for stage, values in timings.items()},
+            "peak_traced_mb": round(peak / 1e6, 2)}
+
+async def measure_throughput(corpus, workers: int, repeat: int) -> dict:
+    """Images per second through the async pipeline with `workers` detections and OCR passes in flight"""
+    previous = ocr._executor
+    ocr._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+    in_flight = asyncio.Semaphore(workers)
+
+    async def detect(contents):
+        async with in_flight:
+            image = await run_in_threadpool(decode_image, contents)
+            plates, _, _ = await read_plate_candidates(image)
+            db = SessionLocal()
+            try:
+                insert_logs(db, rank_matches(db, plates))
+                db.rollback()
+            finally:
+                db.close()
+
+    try:
+        jobs = [contents for _ in range(repeat) for _, contents in corpus]
+        start = time.perf_counter()
+        await asyncio.gather(*(detect(contents) for contents in jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        ocr._executor.shutdown()
+        ocr._executor = previous
+    return {"workers": workers, "images": len(jobs), "seconds": round(elapsed, 3),
+            "images_per_second": round(len(jobs) / elapsed, 2)}
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"Corpus: {report['corpus_size']} images x {report['repeat']} runs, backend {report['backend']}\n")
+    header = f"{'stage':<32} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+    print(header + ("  p50 vs baseline" if baseline else ""))
+    for stage, stats in report["stages"].items():
+        line = f"{stage:<32} {stats['n']:>5} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['max_ms']:9.2f}"
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old and old["p50_ms"]:
+            line += f"  {(stats['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100:+7.1f}%"
+        print(line)
+
+    print(f"\n{'workers':>7} {'images/s':>9}" + ("  vs baseline" if baseline else ""))
+    old_throughput = {t["workers"]: t for t in (baseline or {}).get("throughput", [])}
+    for result in report["throughput"]:
+        line = f"{result['workers']:>7} {result['images_per_second']:9.2f}"
+        old = old_throughput.get(result["workers"])
+        if old:
+            line += f"  {(result['images_per_second'] - old['images_per_second']) / old['images_per_second'] * 100:+7.1f}%"
+        print(line)
+
+    print(f"\nPeak traced memory {report['peak_traced_mb']} MB, max RSS {report['max_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline stage by stage")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="Images to include in the corpus")
+    parser.add_argument("--synthetic", type=int, default=12, help="Synthetic plate renders to add")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs over the corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Concurrency levels for throughput")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    args = parser.parse_args()
+
+    # Every image must really be read
+    ocr_cache.max_size = 0
+    ocr_cache.clear()
+
+    corpus = build_corpus(args.images, args.synthetic)
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "backend": get_backend().name,
+        "corpus_size": len(corpus),
+        "repeat": args.repeat,
+        **benchmark_stages(corpus, args.repeat),
+        "throughput": [asyncio.run(measure_throughput(corpus, n, args.repeat)) for n in args.workers],
+        # ru_maxrss is in KB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark /detect throughput against the number of server workers
+Starts serve.py with each worker count in turn, keeps the server busy with
+concurrent /detect uploads from the benchmark corpus for a fixed time, and
+reports requests per second, latency and the scaling relative to one
+worker, e.g.
+
+    python benchmark_workers.py --workers 1 2 4 8 --seconds 30
+    python benchmark_workers.py --json after.json --compare before.json
+
+The servers run with the OCR result cache off, so every upload is read.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from benchmark_ocr import DEFAULT_IMAGES
+from benchmark_pipeline import build_corpus, percentile
+
+# Server settings for the benchmark runs
+BENCHMARK_ENVIRONMENT = {
+    "OCR_CACHE_SIZE": "0",
+    "OCR_CACHE_PERSIST": "false",
+    "LOG_RETENTION_DAYS": "0",
+    "PYTHONUNBUFFERED": "1"
+}
+
+def multipart_body(filename: str, contents: bytes):
+    """Encode an upload the way a browser form does; returns (body, content type)"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + contents + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def start_server(workers: int, port: int, ocr_threads: int = None, timeout: float = 120) -> subprocess.Popen:
+    """Start serve.py and wait until every worker has warmed up"""
+    command = [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+    if ocr_threads:
+        command += ["--ocr-threads", str(ocr_threads)]
+    server = subprocess.Popen(command, env={**os.environ, **BENCHMARK_ENVIRONMENT},
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    started = 0
+    deadline = time.monotonic() + timeout
+    # uvicorn logs one "Application startup complete" per worker, after its warm-up
+    for line in server.stdout:
+        if "Application startup complete" in line:
+            started += 1
+            if started == workers:
+                break
+        if time.monotonic() > deadline:
+            break
+    if started < workers:
+        server.kill()
+        raise RuntimeError(f"Only {started} of {workers} workers started")
+    # Keep draining the log so the server never blocks on a full pipe
+    threading.Thread(target=lambda: [None for _ in server.stdout], daemon=True).start()
+    return server
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+def run_clients(port: int, corpus, clients: int, seconds: float) -> dict:
+    """Post corpus images from `clients` threads for `seconds`; returns latencies and counts"""
+    uploads = [multipart_body(f"image{i}.jpg", contents) for i, (_, contents) in enumerate(corpus)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        done = []
+        failed = 0
+        i = index
+        while time.monotonic() < deadline:
+            body, content_type = uploads[i % len(uploads)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/detect", body, {"Content-Type": content_type})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+                continue
+            done.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(done)
+            errors.append(failed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None
+    }
+
+def benchmark_workers(corpus, workers: int, port: int, seconds: float, clients_per_worker: int,
+                      ocr_threads: int = None) -> dict:
+    server = start_server(workers, port, ocr_threads)
+    try:
+        clients = workers * clients_per_worker
+        # One short round so every worker has served requests before timing
+        run_clients(port, corpus, clients, min(3, seconds))
+        result = run_clients(port, corpus, clients, seconds)
+    finally:
+        stop_server(server)
+    return {"workers": workers, "clients": clients, **result}
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"Corpus: {report['corpus_size']} images, {report['seconds']}s per run, {report['cpu_count']} cores\n")
+    print(f"{'workers':>7} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6} {'speedup':>8} {'efficiency':>10}"
+          + ("  vs baseline" if baseline else ""))
+    single = report["results"][0]["requests_per_second"] / report["results"][0]["workers"]
+    old_results = {r["workers"]: r for r in (baseline or {}).get("results", [])}
+    for result in report["results"]:
+        speedup = result["requests_per_second"] / single if single else 0.0
+        line = (f"{result['workers']:>7} {result['clients']:>7} {result['requests_per_second']:8.2f} "
+                f"{result['p50_ms'] or 0:8.1f} {result['p95_ms'] or 0:8.1f} {result['errors']:>6} "
+                f"{speedup:7.2f}x {speedup / result['workers'] * 100:9.0f}%")
+        old = old_results.get(result["workers"])
+        if old and old["requests_per_second"]:
+            line += f"  {(result['requests_per_second'] - old['requests_per_second']) / old['requests_per_second'] * 100:+7.1f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /detect throughput for several worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to run, smallest first")
+    parser.add_argument("--ocr-threads", type=int, default=1, help="OCR threads per worker (1 isolates process scaling)")
+    parser.add_argument("--clients-per-worker", type=int, default=2, help="Concurrent uploads per worker")
+    parser.add_argument("--seconds", type=float, default=20, help="Measured time per worker count")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="Images to include in the corpus")
+    parser.add_argument("--synthetic", type=int, default=12, help="Synthetic plate renders to add")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.images, args.synthetic)
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus_size": len(corpus),
+        "seconds": args.seconds,
+        "ocr_threads": args.ocr_threads,
+        "results": []
+    }
+    for workers in sorted(args.workers):
+        print(f"Running {workers} worker(s)...")
+        report["results"].append(benchmark_workers(corpus, workers, args.port, args.seconds,
+                                                   args.clients_per_worker, args.ocr_threads))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print()
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cross-process cache invalidation
+With several server workers (serve.py) every process keeps its own
+registry cache, fuzzy plate index and hotlist, kept in sync with the
+writes it makes itself. Committed registry and violation writes are also
+recorded in the cache_changes table; every worker polls it every
+CACHE_SYNC_SECONDS and applies the changes made by the other processes.
+"""
+
+import os
+import json
+import socket
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, delete, func
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import engine, CacheChange
+from plate_cache import registry_cache, registry_listeners
+from hotlist import hotlist, hotlist_listeners
+
+# Load environment variables
+load_dotenv()
+
+# On by default when serve.py starts more than one worker
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+CACHE_SYNC = os.getenv("CACHE_SYNC", str(WEB_WORKERS > 1)).lower() == "true"
+CACHE_SYNC_SECONDS = float(os.getenv("CACHE_SYNC_SECONDS", "1"))
+# Changes older than this are deleted; every worker has applied them long before
+CACHE_SYNC_RETENTION_SECONDS = 3600
+
+# Identifies this process's own changes, which it has already applied
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+class CacheSync:
+    """Publishes this process's cache invalidations and applies everyone else's"""
+
+    def __init__(self):
+        self._last_id = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.applied = 0
+
+    def publish(self, kind: str, keys):
+        keys = sorted(k for k in keys if k)
+        if not keys:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(CacheChange), {"kind": kind, "keys": json.dumps(keys), "origin": ORIGIN,
+                                                   "created_at": datetime.utcnow()})
+            self.published += 1
+        except Exception as e:
+            # The other workers keep stale entries until they expire or restart
+            print(f"Could not publish {kind} cache change: {e}")
+
+    def publish_registry(self, normalized_plates):
+        """Registry listener"""
+        self.publish("registry", normalized_plates)
+
+    def publish_hotlist(self, vehicle_ids):
+        """Hotlist listener"""
+        self.publish("hotlist", vehicle_ids)
+
+    def start(self):
+        """Skip changes made before this process loaded its caches"""
+        with engine.connect() as conn:
+            self._last_id = conn.execute(select(func.max(CacheChange.id))).scalar() or 0
+
+    def apply_changes(self) -> int:
+        """Apply changes published by other processes since the last call; returns how many"""
+        with self._lock:
+            if self._last_id is None:
+                self.start()
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(CacheChange.id, CacheChange.kind, CacheChange.keys, CacheChange.origin)
+                    .where(CacheChange.id > self._last_id)
+                    .order_by(CacheChange.id)
+                ).all()
+            applied = 0
+            for row_id, kind, keys, origin in rows:
+                self._last_id = row_id
+                if origin == ORIGIN:
+                    continue
+                keys = json.loads(keys)
+                if kind == "registry":
+                    plates = set(keys)
+                    registry_cache.invalidate(plates)
+                    for listener in registry_listeners:
+                        if listener != self.publish_registry:
+                            listener(plates)
+                elif kind == "hotlist":
+                    hotlist.refresh_vehicles(set(keys))
+                applied += 1
+            self.applied += applied
+            return applied
+
+    def prune(self):
+        """Delete old changes, keeping the newest so SQLite never hands its id out again"""
+        cutoff = datetime.utcnow() - timedelta(seconds=CACHE_SYNC_RETENTION_SECONDS)
+        with engine.begin() as conn:
+            newest_id = conn.execute(select(func.max(CacheChange.id))).scalar() or 0
+            conn.execute(delete(CacheChange).where(CacheChange.created_at < cutoff, CacheChange.id < newest_id))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CACHE_SYNC,
+            "origin": ORIGIN,
+            "last_change_id": self._last_id,
+            "published": self.published,
+            "applied": self.applied
+        }
+
+cache_sync = CacheSync()
+if CACHE_SYNC:
+    registry_listeners.append(cache_sync.publish_registry)
+    hotlist_listeners.append(cache_sync.publish_hotlist)
+
+async def sync_loop():
+    """Apply other workers' cache changes every CACHE_SYNC_SECONDS while the server runs"""
+    polls = 0
+    while True:
+        try:
+            await run_in_threadpool(cache_sync.apply_changes)
+            polls += 1
+            if polls % 600 == 0:
+                await run_in_threadpool(cache_sync.prune)
+        except Exception as e:
+            print(f"Cache sync failed: {e}")
+        await asyncio.sleep(CACHE_SYNC_SECONDS)
@@ -1,19 +1,101 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Date, ForeignKey, Text, Boolean, Float, Enum
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Date, ForeignKey, Text, Boolean, Float, Enum, LargeBinary, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, validates
 from datetime import datetime
 import os
+import re
 import enum
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
 
 # Create database directory if it doesn't exist
 os.makedirs("data", exist_ok=True)
 
 # Database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./data/plate_detection.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/plate_detection.db")
+# Connections kept open per engine, and extra ones allowed under bursts
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds a request waits for a free pooled connection
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# SQLite tuning, applied to every new connection. WAL lets readers run
+# while a write is in progress; synchronous=NORMAL is durable against
+# application crashes under WAL (a power cut can lose the last commits)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+# How long a connection waits for another writer's lock before failing
+# with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": -SQLITE_CACHE_SIZE_KB,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS
+}
+
+def create_database_engine(url: str = DATABASE_URL, read_only: bool = False, pragmas: dict = None):
+    """Create a pooled engine for `url`, applying the SQLite pragmas to each connection
+
+    A read-only engine refuses writes (query_only) and leaves the journal
+    mode to the read-write engine.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT, pool_pre_ping=True)
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    pool_args = {} if in_memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_args)
+
+    pragmas = dict(SQLITE_PRAGMAS if pragmas is None else pragmas)
+    if read_only:
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = "ON"
+    if in_memory:
+        pragmas.pop("journal_mode", None)
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return sqlite_engine
+
+engine = create_database_engine()
+# For endpoints that only read: a separate pool, so long reports and
+# listings never queue behind connections held by detection writes
+read_engine = create_database_engine(read_only=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+def normalize_plate_number(plate):
+    """Normalize plate number by removing spaces, hyphens, and converting to uppercase"""
+    if not plate:
+        return ""
+    # Remove all non-alphanumeric characters and convert to uppercase
+    normalized = re.sub(r'[^A-Za-z0-9]', '', plate).upper()
+    return normalized
+
+# Values bound per IN (...) query; SQLite allows 32766 variables per statement
+IN_QUERY_CHUNK_SIZE = 500
+
+def chunked(values, size: int = IN_QUERY_CHUNK_SIZE):
+    """Split values into lists of at most `size`, for IN queries"""
+    values = list(values)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
 # Models
 class Owner(Base):
     __tablename__ = "owners"
@@ -39,6 +121,7 @@ class Vehicle(Base):
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("owners.id"), nullable=False)
     plate_number = Column(String(20), unique=True, nullable=False, index=True)
+    normalized_plate = Column(String(20), unique=True, index=True)  # Kept in sync with plate_number
     make = Column(String(50))
     model = Column(String(50))
     year = Column(Integer)
@@ -52,6 +135,11 @@ class Vehicle(Base):
     # Relationships
     owner = relationship("Owner", back_populates="vehicles")
     detections = relationship("DetectionLog", back_populates="vehicle")
+    
+    @validates("plate_number")
+    def _sync_normalized_plate(self, key, plate_number):
+        self.normalized_plate = normalize_plate_number(plate_number)
+        return plate_number
 
 class DetectionLog(Base):
     __tablename__ = "detection_logs"
@@ -62,12 +150,45 @@ class DetectionLog(Base):
     confidence = Column(Integer)
     source = Column(String(20))  # upload, camera, manual
     image_path = Column(String(255))
-    detected_at = Column(DateTime, default=datetime.utcnow)
+    detected_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Repeat reads from the same camera merged into this row (see log_writer)
+    hit_count = Column(Integer, default=1, server_default="1")
+    last_seen_at = Column(DateTime)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"))
     
     # Relationship
     vehicle = relationship("Vehicle", back_populates="detections")
 
+class DetectionJob(Base):
+    __tablename__ = "detection_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    status = Column(String(20), default="queued", index=True)  # queued, running, done, failed
+    source = Column(String(20))  # upload, camera
+    image = Column(LargeBinary)  # Raw upload, cleared once the job finishes
+    result = Column(Text)  # JSON string
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class OCRCacheEntry(Base):
+    __tablename__ = "ocr_cache"
+    
+    key = Column(String(64), primary_key=True)  # Image content hash + pipeline fingerprint
+    candidates = Column(Text)  # JSON list of plate candidates
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class CacheChange(Base):
+    __tablename__ = "cache_changes"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20))  # registry (normalized plates) or hotlist (vehicle ids)
+    keys = Column(Text)  # JSON list
+    origin = Column(String(100))  # Server process that made the change
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 # Enums for user roles and status
 class UserRole(enum.Enum):
     SUPER_ADMIN = "super_admin"
@@ -221,10 +342,71 @@ class AuditLog(Base):
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+def migrate_normalized_plates():
+    """Add and backfill vehicles.normalized_plate on databases created before the column existed"""
+    columns = [c["name"] for c in inspect(engine).get_columns("vehicles")]
+    with engine.begin() as conn:
+        if "normalized_plate" not in columns:
+            conn.execute(text("ALTER TABLE vehicles ADD COLUMN normalized_plate VARCHAR(20)"))
+        
+        # Backfill rows written before the column existed or by raw SQL
+        rows = conn.execute(text(
+            "SELECT id, plate_number FROM vehicles WHERE normalized_plate IS NULL"
+        )).fetchall()
+        for vehicle_id, plate_number in rows:
+            conn.execute(
+                text("UPDATE vehicles SET normalized_plate = :plate WHERE id = :id"),
+                {"plate": normalize_plate_number(plate_number), "id": vehicle_id}
+            )
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_vehicles_normalized_plate "
+                "ON vehicles (normalized_plate)"
+            ))
+    except IntegrityError:
+        # Plates such as "ABC-123" and "ABC123" collide once normalized; index
+        # them anyway so lookups stay fast, and leave the cleanup to an admin
+        print("Warning: duplicate normalized plate numbers found, creating non-unique index")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_vehicles_normalized_plate "
+                "ON vehicles (normalized_plate)"
+            ))
+
+migrate_normalized_plates()
+
+def migrate_detection_logs(bind=engine):
+    """Add the detected_at index and the hit columns to detection_logs tables created before them
+
+    Also run on archived detection log partitions, which have their own engine.
+    """
+    columns = [c["name"] for c in inspect(bind).get_columns("detection_logs")]
+    with bind.begin() as conn:
+        if "hit_count" not in columns:
+            conn.execute(text("ALTER TABLE detection_logs ADD COLUMN hit_count INTEGER DEFAULT 1"))
+        if "last_seen_at" not in columns:
+            conn.execute(text("ALTER TABLE detection_logs ADD COLUMN last_seen_at DATETIME"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_detection_logs_detected_at "
+            "ON detection_logs (detected_at)"
+        ))
+
+migrate_detection_logs()
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency for read-only endpoints
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
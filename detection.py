@@ -0,0 +1,361 @@
+"""
+Plate detection pipeline
+Shared by /detect and the other ingestion paths: decode, preprocess,
+localize, OCR, candidate extraction and registry matching
+"""
+
+import os
+import re
+import io
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from database import SessionLocal, normalize_plate_number
+from plate_cache import registry_cache, lookup_vehicle, lookup_vehicles
+from hotlist import hotlist
+from plate_matcher import plate_index
+from ocr import FULL_FRAME_STAGES, ROI_OCR_CONFIGS, OCR_LANG, OCRRead, get_backend, run_stage, run_roi_ocr_passes, warm_up as warm_up_ocr
+from ocr_cache import ocr_cache, image_key
+from plate_grammar import PLATE_REGISTRY_DECODING, plate_grammar, registered_prefixes, find_plates
+from plate_localization import PLATE_LOCALIZATION, PLATE_MAX_REGIONS, locate_plates
+from stage_timing import StageTimer
+from log_writer import log_writer
+
+# Load environment variables
+load_dotenv()
+
+# Candidates looked up and logged per image
+MAX_PLATES_PER_IMAGE = 3
+
+# Longest side of the working image. Larger photos are decoded at reduced
+# resolution and downscaled; plates stay readable well below phone-camera sizes
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "1920"))
+
+# JPEG can be decoded directly at 1/8, 1/4 or 1/2 scale (DCT scaling),
+# without ever holding the full-resolution pixels
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# Candidates whose combined OCR confidence (0-100) is below this are dropped
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "30"))
+# Added to a candidate's best pass confidence for every other pass that agrees
+AGREEMENT_BONUS = 5
+# Subtracted from a read's confidence for every character the plate grammar
+# decoded as the other class (e.g. a 0 in a letter position read as O)
+CORRECTION_PENALTY = 5
+
+# Early-exit rules checked after each full-frame OCR cascade stage:
+# "registered" (a candidate is exactly a registered plate) and "grammar"
+# (a candidate fits the plate grammar as read, with at least OCR_STOP_CONFIDENCE).
+# "none" always runs every pass.
+OCR_STOP_RULES = {rule.strip() for rule in os.getenv("OCR_STOP_RULES", "registered,grammar").lower().split(",")} - {"", "none"}
+OCR_STOP_CONFIDENCE = float(os.getenv("OCR_STOP_CONFIDENCE", "80"))
+
+# Bump whenever preprocessing or candidate extraction changes so cached OCR
+# results from the old pipeline are no longer used
+PIPELINE_VERSION = 3
+
+_pipeline_fingerprint = None
+
+def pipeline_fingerprint() -> str:
+    """Identify everything that affects the candidates read from an image"""
+    global _pipeline_fingerprint
+    if _pipeline_fingerprint is None:
+        _pipeline_fingerprint = repr((
+            PIPELINE_VERSION, get_backend().name, OCR_LANG, FULL_FRAME_STAGES, ROI_OCR_CONFIGS,
+            PLATE_LOCALIZATION, PLATE_MAX_REGIONS, sorted(OCR_STOP_RULES), plate_grammar.formats, PLATE_REGISTRY_DECODING,
+            OCR_MIN_CONFIDENCE, OCR_STOP_CONFIDENCE
+        ))
+    return _pipeline_fingerprint
+
+def image_dimensions(contents: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the image header without decoding the pixels"""
+    try:
+        with Image.open(io.BytesIO(contents)) as img:
+            return img.size
+    except Exception:
+        return None
+
+def limit_image_size(image: np.ndarray, max_dimension: int = MAX_IMAGE_DIMENSION) -> np.ndarray:
+    """Downscale an image so its longest side is at most `max_dimension`"""
+    longest = max(image.shape[:2])
+    if not max_dimension or longest <= max_dimension:
+        return image
+    scale = max_dimension / longest
+    # INTER_AREA is needed to avoid aliasing on big reductions but is slow
+    # for the slight ones left after a reduced decode
+    interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+def decode_image(contents: bytes, max_dimension: int = MAX_IMAGE_DIMENSION) -> Optional[np.ndarray]:
+    """Decode uploaded image bytes into a BGR image of bounded size, or None if they are not an image"""
+    flags = cv2.IMREAD_COLOR
+    size = image_dimensions(contents)
+    if size and max_dimension:
+        # Largest reduction that still leaves at least max_dimension pixels
+        for factor, reduced in REDUCED_DECODE_FLAGS:
+            if max(size) // factor >= max_dimension:
+                flags = reduced
+                break
+
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), flags)
+    if image is None:
+        return None
+    return limit_image_size(image, max_dimension)
+
+def decode_data_url(image_data: str) -> bytes:
+    """Return the raw bytes of a base64 data URL sent by the camera UI"""
+    return base64.b64decode(image_data.split(',')[1])
+
+def preprocess_image(image):
+    """Preprocess image for better OCR accuracy"""
+    # Convert to grayscale
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # Simple preprocessing - just return grayscale for now
+    # This will help us debug if the complex preprocessing is the issue
+    return gray
+
+def clean_ocr_text(text):
+    """Uppercase OCR text and fix common OCR artifacts"""
+    text = text.upper()
+
+    # Remove common OCR artifacts (O/0 style confusions are left to the
+    # fuzzy registry matcher, since real plates contain both)
+    text = text.replace('|', 'I')
+    text = text.replace('$', 'S')
+    text = text.replace('&', '8')
+    return text
+
+def extract_plate_number(text):
+    """Extract the plate candidates that fit the plate grammar (or the registry) from OCR text"""
+    return [candidate.text for candidate in find_plates(clean_ocr_text(text))]
+
+def char_confidences(text: str, word_confidences: List[float]) -> List[float]:
+    """Confidence of the word each character of `text` belongs to (0 for separators)"""
+    confidences = [0.0] * len(text)
+    for word, confidence in zip(re.finditer(r'\S+', text), word_confidences):
+        confidences[word.start():word.end()] = [confidence] * (word.end() - word.start())
+    return confidences
+
+def collect_candidates(reads: dict, ocr_reads: List[OCRRead]):
+    """Add the plate candidates of each pass to `reads` (normalized plate -> text and per-pass confidences)
+
+    A candidate's confidence in a pass is the mean confidence of its
+    characters, less CORRECTION_PENALTY for every character the grammar had
+    to decode as the other class.
+    """
+    for read in ocr_reads:
+        text = clean_ocr_text(read.text)
+        confidences = char_confidences(text, read.word_confidences)
+        seen = set()
+        for candidate in find_plates(text):
+            normalized = normalize_plate_number(candidate.text)
+            if len(normalized) < 4 or normalized in seen:
+                continue
+            seen.add(normalized)
+            span = [c for c, char in zip(confidences[candidate.start:candidate.end], text[candidate.start:candidate.end]) if char.isalnum()]
+            confidence = sum(span) / len(span) - CORRECTION_PENALTY * candidate.corrections
+            entry = reads.setdefault(normalized, {"text": candidate.text, "confidences": []})
+            entry["confidences"].append(max(confidence, 0.0))
+
+def rank_candidates(reads: dict) -> List[dict]:
+    """Combine each candidate's reads into one confidence and rank candidates by it
+
+    A candidate scores its best pass plus AGREEMENT_BONUS for every other
+    pass that read it too; candidates below OCR_MIN_CONFIDENCE are dropped.
+    Ties keep read order.
+    """
+    plates = []
+    for entry in reads.values():
+        confidences = entry["confidences"]
+        confidence = min(100.0, max(confidences) + AGREEMENT_BONUS * (len(confidences) - 1))
+        if confidence < OCR_MIN_CONFIDENCE:
+            continue
+        plates.append({
+            "text": entry["text"],
+            "confidence": round(confidence),
+            "reads": len(confidences)
+        })
+    plates.sort(key=lambda plate: plate["confidence"], reverse=True)
+    return plates
+
+def meets_stop_rule(plates: List[dict]) -> bool:
+    """Whether the candidates read so far are good enough to skip the remaining OCR passes"""
+    for plate in plates:
+        normalized = normalize_plate_number(plate["text"])
+        if ("grammar" in OCR_STOP_RULES and plate["confidence"] >= OCR_STOP_CONFIDENCE
+                and plate_grammar.matches(normalized)):
+            return True
+        if "registered" in OCR_STOP_RULES and normalized in plate_index:
+            return True
+    return False
+
+async def read_plate_candidates(image, timer: StageTimer = None) -> Tuple[List[dict], int, bool]:
+    """Return unique plate candidates, most confident first, the number of OCR passes run and whether any failed
+
+    Images seen before are answered from the OCR cache without running any
+    passes. Reads with a failed pass are not cached, so the image is read
+    again once Tesseract works. With a StageTimer, the time of each stage
+    is recorded on it.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("cache"):
+        key, plates = await run_in_threadpool(_cached_candidates, image)
+    if plates is not None:
+        return plates, 0, False
+    plates, passes_run, failed = await _read_plate_candidates(image, timer)
+    if not failed:
+        await run_in_threadpool(ocr_cache.put, key, plates)
+    return plates, passes_run, failed
+
+def _cached_candidates(image):
+    """The image's OCR cache key and cached candidates (None on a miss); may load the persisted cache"""
+    key = image_key(image, pipeline_fingerprint())
+    return key, ocr_cache.get(key)
+
+async def _read_plate_candidates(image, timer: StageTimer) -> Tuple[List[dict], int, bool]:
+    """Run OCR on a decoded image and return ranked plate candidates"""
+    # Preprocess the image
+    with timer.stage("preprocess"):
+        processed_image = preprocess_image(image)
+    passes_run = 0
+    failed = False
+    reads = {}
+
+    # Read only the plate-shaped regions when any are found
+    regions = []
+    if PLATE_LOCALIZATION:
+        with timer.stage("localize"):
+            regions = await run_in_threadpool(locate_plates, processed_image)
+    if regions:
+        roi_reads = await run_roi_ocr_passes(regions, timer)
+        passes_run += len(roi_reads)
+        failed = failed or any(read.failed for read in roi_reads)
+        with timer.stage("extract"):
+            collect_candidates(reads, roi_reads)
+    with timer.stage("extract"):
+        plates = rank_candidates(reads)
+
+    # Otherwise read the whole frame, cheapest passes first, until a stop
+    # rule is met
+    if not plates:
+        for stage in FULL_FRAME_STAGES:
+            stage_reads = await run_stage(stage, processed_image, image, timer)
+            passes_run += len(stage_reads)
+            failed = failed or any(read.failed for read in stage_reads)
+            with timer.stage("extract"):
+                collect_candidates(reads, stage_reads)
+                plates = rank_candidates(reads)
+            if meets_stop_rule(plates):
+                break
+
+    return plates, passes_run, failed
+
+def match_vehicle(db: Session, plate_text: str, exact: dict = None):
+    """Find the registered vehicle for an OCR read
+
+    Tries the exact normalized plate first, then the nearest registered
+    plate for OCR confusions. `exact` may hold summaries already fetched
+    in bulk (see plate_cache.lookup_vehicles). Returns (summary, match) or
+    (None, None).
+    """
+    if exact is not None:
+        vehicle = exact.get(normalize_plate_number(plate_text))
+    else:
+        vehicle = lookup_vehicle(db, plate_text)
+    if vehicle:
+        return vehicle, {"distance": 0.0, "score": 1.0}
+
+    nearest = plate_index.best_match(plate_text)
+    if nearest:
+        vehicle = lookup_vehicle(db, nearest.plate)
+        if vehicle:
+            return vehicle, {"distance": nearest.distance, "score": nearest.score}
+    return None, None
+
+def plate_result(plate: dict, vehicle, match) -> dict:
+    """Build the per-plate payload returned to clients"""
+    result = {
+        "text": plate['text'],
+        "confidence": plate['confidence'],
+        "reads": plate.get('reads', 1)
+    }
+    if vehicle:
+        result['vehicle_info'] = vehicle['vehicle_info']
+        result['match'] = {"plate": vehicle['plate_number'], **match}
+        # Unpaid/overdue violations, expired or suspended registration
+        alert = hotlist.alert(vehicle['plate_number'])
+        if alert:
+            result['alert'] = alert
+    return result
+
+def detection_log_row(plate: dict, vehicle, source: str, image_path: str = None) -> dict:
+    """DetectionLog columns for a read plate, as queued on log_writer"""
+    return {
+        "plate_number": plate['text'].upper(),
+        "detected_text": plate['text'],
+        "confidence": plate['confidence'],
+        "source": source,
+        "image_path": image_path,
+        "detected_at": datetime.utcnow(),
+        "vehicle_id": vehicle['vehicle_id'] if vehicle else None
+    }
+
+def rank_matches(db: Session, plates: List[dict], exact: dict = None):
+    """Match every candidate against the registry and rank them
+
+    Registered plates come first (exact before fuzzy matches), then the rest
+    by OCR confidence. Returns (plate, vehicle, match) tuples.
+    """
+    # Look up vehicles in the registry cache using normalized plates,
+    # falling back to the nearest registered plate for OCR confusions
+    matches = [(plate, *match_vehicle(db, plate['text'], exact)) for plate in plates]
+    matches.sort(key=lambda m: (m[1] is not None, m[2]['score'] if m[2] else 0.0, m[0]['confidence']), reverse=True)
+    return matches
+
+def log_plate_results(db: Session, plates: List[dict], source: str, exact: dict = None, image_path: str = None,
+                      source_key: str = None) -> List[dict]:
+    """Rank the candidates against the registry and log the top ones
+
+    The DetectionLog rows are queued on the write-behind log_writer rather
+    than added to `db`. `image_path` is the image's path in the evidence
+    store, `source_key` the camera for deduplicating repeat reads. Returns
+    the per-plate payloads.
+    """
+    results = []
+    rows = []
+    for plate, vehicle, match in rank_matches(db, plates, exact)[:MAX_PLATES_PER_IMAGE]:
+        # Log the detection with the OCR confidence of the read
+        rows.append(detection_log_row(plate, vehicle, source, image_path))
+
+        # Prepare result with owner info if found
+        results.append(plate_result(plate, vehicle, match))
+    log_writer.add(rows, source_key)
+    return results
+
+def warm_up() -> dict:
+    """Load the OCR engines and the registry indexes before the first detection
+
+    Run once per server process at startup, so the first requests a worker
+    takes are not the ones paying for engine and index loads.
+    """
+    ocr_threads = warm_up_ocr()
+    plate_index.ensure_loaded()
+    registered_prefixes.ensure_loaded()
+    hotlist.ensure_loaded()
+    db = SessionLocal()
+    try:
+        cached = len(lookup_vehicles(db, plate_index.plates()[:registry_cache.max_size]))
+    finally:
+        db.close()
+    return {"ocr_threads": ocr_threads, "registered_plates": len(plate_index), "cached_plates": cached}
@@ -0,0 +1,261 @@
+"""
+Asynchronous detection jobs
+Images are queued in the detection_jobs table and drained by a pool of
+local OCR workers, so clients get a job id immediately and poll (or
+long-poll) for the result. The queue lives in the database, so queued
+work survives restarts and can be shared by several server processes.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import SessionLocal, DetectionJob
+from detection import decode_image, read_plate_candidates, log_plate_results
+from image_store import store_image
+
+# Load environment variables
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Running jobs older than this are assumed lost (worker crashed) and requeued
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+# Finished jobs are kept this long for clients to fetch their results
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+
+# Idle workers re-check the table this often, which also picks up jobs
+# queued by other server processes
+JOB_POLL_INTERVAL = 0.5
+JOB_SWEEP_INTERVAL = 60
+
+class QueueFullError(Exception):
+    """Raised when the detection queue is at JOB_QUEUE_MAX_DEPTH"""
+
+def enqueue_job(db: Session, contents: bytes, source: str) -> DetectionJob:
+    """Queue an image for detection"""
+    depth = db.query(DetectionJob).filter(DetectionJob.status == "queued").count()
+    if depth >= JOB_QUEUE_MAX_DEPTH:
+        raise QueueFullError()
+
+    job = DetectionJob(id=uuid.uuid4().hex, status="queued", source=source, image=contents)
+    db.add(job)
+    db.commit()
+    # Load it here so the caller does not query after the commit expired it
+    db.refresh(job)
+    job_queue.notify()
+    return job
+
+def claim_next_job(db: Session) -> Optional[DetectionJob]:
+    """Move the oldest queued job to running, or return None if the queue is empty
+
+    The conditional UPDATE makes the claim atomic, so several workers or
+    processes never pick up the same job.
+    """
+    while True:
+        job_id = db.query(DetectionJob.id).filter(
+            DetectionJob.status == "queued"
+        ).order_by(DetectionJob.created_at).limit(1).scalar()
+        if job_id is None:
+            return None
+
+        claimed = db.execute(
+            update(DetectionJob)
+            .where(DetectionJob.id == job_id, DetectionJob.status == "queued")
+            .values(status="running", started_at=datetime.utcnow(), attempts=DetectionJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(DetectionJob, job_id)
+
+def sweep_jobs(db: Session):
+    """Requeue jobs abandoned by crashed workers and purge expired results"""
+    now = datetime.utcnow()
+    stale = db.query(DetectionJob).filter(
+        DetectionJob.status == "running",
+        DetectionJob.started_at < now - timedelta(seconds=JOB_STALE_SECONDS)
+    )
+    # A job that keeps taking its worker down is given up on
+    stale.filter(DetectionJob.attempts >= JOB_MAX_ATTEMPTS).update(
+        {"status": "failed", "error": "Worker lost while processing", "image": None, "finished_at": now},
+        synchronize_session=False
+    )
+    stale.update({"status": "queued"}, synchronize_session=False)
+    db.query(DetectionJob).filter(
+        DetectionJob.status.in_(["done", "failed"]),
+        DetectionJob.finished_at < now - timedelta(hours=JOB_RESULT_TTL_HOURS)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def queue_stats(db: Session) -> dict:
+    """Queue depth per status and the age of the oldest waiting job"""
+    counts = dict(db.query(DetectionJob.status, func.count(DetectionJob.id)).group_by(DetectionJob.status).all())
+    oldest = db.query(func.min(DetectionJob.created_at)).filter(DetectionJob.status == "queued").scalar()
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_queued_age_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+        "max_depth": JOB_QUEUE_MAX_DEPTH,
+        "workers": JOB_WORKERS
+    }
+
+def job_to_dict(job: DetectionJob) -> dict:
+    """Serialize a job for API responses"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "source": job.source,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error
+    }
+
+class DetectionJobQueue:
+    """Pool of asyncio workers draining the detection_jobs table"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._loop = None
+        self._wakeup = None
+        self._finished = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job was queued; safe to call from any thread"""
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _job_finished(self):
+        # Waiters hold the old event; swap in a fresh one for the next job
+        event, self._finished = self._finished, asyncio.Event()
+        event.set()
+
+    async def _worker(self, index: int):
+        last_sweep = 0.0
+        while True:
+            try:
+                if index == 0 and time.monotonic() - last_sweep > JOB_SWEEP_INTERVAL:
+                    last_sweep = time.monotonic()
+                    await run_in_threadpool(self._sweep)
+                if await self.run_next_job():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Detection job worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
+
+    def _sweep(self):
+        db = SessionLocal()
+        try:
+            sweep_jobs(db)
+        finally:
+            db.close()
+
+    async def run_next_job(self) -> bool:
+        """Process one queued job; returns False when the queue is empty"""
+        db = SessionLocal()
+        try:
+            job = await run_in_threadpool(claim_next_job, db)
+            if job is None:
+                return False
+
+            try:
+                image = await run_in_threadpool(decode_image, job.image)
+                if image is None:
+                    result = {"success": False, "error": "Failed to process image"}
+                else:
+                    # Only images that decode are kept as evidence
+                    image_path = await run_in_threadpool(store_image, job.image)
+                    plates, passes_run, _ = await read_plate_candidates(image)
+                    result = {
+                        "success": True,
+                        "plates": await run_in_threadpool(log_plate_results, db, plates, job.source,
+                                                          image_path=image_path),
+                        "source": job.source,
+                        "passes_run": passes_run
+                    }
+                await run_in_threadpool(self._finish, db, job, result)
+            except Exception as e:
+                await run_in_threadpool(self._finish, db, job, error=str(e))
+            self._job_finished()
+            return True
+        finally:
+            db.close()
+
+    def _finish(self, db: Session, job: DetectionJob, result: dict = None, error: str = None):
+        """Store a job's result, or requeue it after an error"""
+        if error is None:
+            job.status = "done"
+            job.result = json.dumps(result)
+        else:
+            db.rollback()
+            job.status = "queued" if job.attempts < JOB_MAX_ATTEMPTS else "failed"
+            job.error = error
+
+        if job.status != "queued":
+            job.image = None
+            job.finished_at = datetime.utcnow()
+        db.commit()
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            job = db.get(DetectionJob, job_id)
+            return job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Return the job, waiting up to `timeout` seconds for it to finish"""
+        deadline = time.monotonic() + timeout
+        while True:
+            # Grab the event before reading the job so a finish in between is not missed
+            finished = self._finished
+            data = await run_in_threadpool(self._load, job_id)
+
+            remaining = deadline - time.monotonic()
+            if data is None or data["status"] in ("done", "failed") or remaining <= 0:
+                return data
+
+            # Jobs finished by other processes are only seen by polling
+            try:
+                if finished is None:
+                    await asyncio.sleep(min(JOB_POLL_INTERVAL, remaining))
+                else:
+                    await asyncio.wait_for(finished.wait(), min(JOB_POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+job_queue = DetectionJobQueue()
@@ -0,0 +1,99 @@
+"""
+Near-duplicate frame suppression for camera input
+Camera frames of a plate held in view differ by sensor noise and JPEG
+artifacts, so exact content hashing misses them. Each frame gets a
+difference hash (dHash); a frame within a few bits of one processed
+recently by the same camera reuses that frame's OCR result.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FRAME_DEDUPE = os.getenv("FRAME_DEDUPE", "true").lower() == "true"
+# Differing hash bits (out of FRAME_HASH_SIZE ** 2) still treated as the same frame
+FRAME_DEDUPE_THRESHOLD = int(os.getenv("FRAME_DEDUPE_THRESHOLD", "10"))
+# How long a processed frame can be reused
+FRAME_DEDUPE_TTL_SECONDS = float(os.getenv("FRAME_DEDUPE_TTL_SECONDS", "5"))
+
+# 8x8 gradient grid (64 bits); finer grids flip too many bits on small
+# camera shake to separate repeats from new frames
+FRAME_HASH_SIZE = 8
+# Recent frames remembered per camera, and cameras tracked at once
+FRAMES_PER_SOURCE = 16
+MAX_SOURCES = 1000
+
+def dhash(image: np.ndarray, hash_size: int = FRAME_HASH_SIZE) -> np.ndarray:
+    """Difference hash of an image as packed bits (hash_size ** 2 bits)"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+def hamming_distances(hashes: np.ndarray, frame_hash: np.ndarray) -> np.ndarray:
+    """Bit distance from `frame_hash` to each row of `hashes`"""
+    return np.unpackbits(np.bitwise_xor(hashes, frame_hash), axis=1).sum(axis=1)
+
+class FrameDeduplicator:
+    """Short-lived per-source index of recently processed frame hashes"""
+
+    def __init__(self, threshold: int = FRAME_DEDUPE_THRESHOLD, ttl: float = FRAME_DEDUPE_TTL_SECONDS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self._sources = OrderedDict()  # source -> deque of (seen_at, hash, candidates)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, source: str, frame_hash: np.ndarray) -> Optional[List[dict]]:
+        """Return the candidates of a recent near-identical frame from `source`, or None"""
+        now = time.monotonic()
+        with self._lock:
+            frames = self._sources.get(source)
+            if frames:
+                while frames and now - frames[0][0] > self.ttl:
+                    frames.popleft()
+            if not frames:
+                self.misses += 1
+                return None
+
+            distances = hamming_distances(np.stack([h for _, h, _ in frames]), frame_hash)
+            best = int(np.argmin(distances))
+            if distances[best] > self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return [dict(plate) for plate in frames[best][2]]
+
+    def remember(self, source: str, frame_hash: np.ndarray, candidates: List[dict]):
+        """Record a frame that went through OCR"""
+        with self._lock:
+            frames = self._sources.get(source)
+            if frames is None:
+                frames = self._sources[source] = deque(maxlen=FRAMES_PER_SOURCE)
+            self._sources.move_to_end(source)
+            frames.append((time.monotonic(), frame_hash, [dict(plate) for plate in candidates]))
+            while len(self._sources) > MAX_SOURCES:
+                self._sources.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for tuning the threshold"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sources": len(self._sources),
+                "threshold_bits": self.threshold,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+frame_index = FrameDeduplicator()
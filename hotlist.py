@@ -0,0 +1,243 @@
+"""
+Hotlist of flagged plates
+Precomputes, for every vehicle with unpaid or overdue violations or an
+expired or suspended registration, the reasons and the amount owed, keyed
+by normalized plate. Detection checks a plate with one dict lookup; the
+hotlist is patched after every committed write to violations, payments or
+vehicles, and rebuilt once a day since registrations expire by date.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+from database import (
+    SessionLocal, Vehicle, Violation, Payment, ViolationStatus, PaymentStatus, IN_QUERY_CHUNK_SIZE,
+    normalize_plate_number, chunked
+)
+from plate_cache import registry_listeners
+
+# Violations that still have to be paid
+UNPAID_STATUSES = (ViolationStatus.PENDING, ViolationStatus.OVERDUE)
+FLAGGED_VEHICLE_STATUSES = ("expired", "suspended")
+
+# Callables notified with the vehicle ids affected by each committed
+# violation or payment write (used to sync other server processes)
+hotlist_listeners = []
+
+@dataclass
+class HotlistEntry:
+    vehicle_id: int
+    plate_number: str
+    vehicle_status: str
+    expiry_date: Optional[date]
+    outstanding_amount: float = 0.0
+    # (status, due date) of each unpaid violation; overdue is decided when checked
+    unpaid: Tuple[Tuple[ViolationStatus, Optional[datetime]], ...] = ()
+
+    def alert(self, now: datetime) -> Optional[dict]:
+        """Alert block for this vehicle as of `now`, or None if nothing is flagged"""
+        overdue = sum(
+            1 for status, due_date in self.unpaid
+            if status == ViolationStatus.OVERDUE or (due_date is not None and due_date < now)
+        )
+        reasons = []
+        if len(self.unpaid) > overdue:
+            reasons.append("unpaid_violations")
+        if overdue:
+            reasons.append("overdue_violations")
+        if self.vehicle_status == "suspended":
+            reasons.append("suspended_registration")
+        if self.vehicle_status == "expired" or (self.expiry_date is not None and self.expiry_date < now.date()):
+            reasons.append("expired_registration")
+        if not reasons:
+            return None
+        return {
+            "plate": self.plate_number,
+            "reasons": reasons,
+            "unpaid_violations": len(self.unpaid),
+            "overdue_violations": overdue,
+            "outstanding_amount": round(self.outstanding_amount, 2)
+        }
+
+def load_entries(db: Session, vehicle_ids=None) -> List[HotlistEntry]:
+    """Hotlist entries for the given vehicles, or for every flagged vehicle"""
+    if vehicle_ids is not None and len(vehicle_ids) > IN_QUERY_CHUNK_SIZE:
+        return [entry for chunk in chunked(vehicle_ids) for entry in load_entries(db, chunk)]
+
+    paid = (
+        db.query(Payment.violation_id, func.sum(Payment.amount).label("paid"))
+        .filter(Payment.status == PaymentStatus.COMPLETED)
+        .group_by(Payment.violation_id)
+        .subquery()
+    )
+    violations = (
+        db.query(Violation.vehicle_id, Violation.status, Violation.due_date, Violation.fine_amount, paid.c.paid)
+        .outerjoin(paid, paid.c.violation_id == Violation.id)
+        .filter(Violation.status.in_(UNPAID_STATUSES), Violation.vehicle_id.isnot(None))
+    )
+    if vehicle_ids is not None:
+        violations = violations.filter(Violation.vehicle_id.in_(vehicle_ids))
+    unpaid = {}
+    for vehicle_id, status, due_date, fine_amount, paid_amount in violations:
+        unpaid.setdefault(vehicle_id, []).append((status, due_date, max((fine_amount or 0.0) - (paid_amount or 0.0), 0.0)))
+
+    vehicles = db.query(Vehicle)
+    if vehicle_ids is not None:
+        vehicles = vehicles.filter(Vehicle.id.in_(vehicle_ids))
+    else:
+        unpaid_vehicles = select(Violation.vehicle_id).where(Violation.status.in_(UNPAID_STATUSES))
+        vehicles = vehicles.filter(or_(
+            Vehicle.id.in_(unpaid_vehicles),
+            Vehicle.status.in_(FLAGGED_VEHICLE_STATUSES),
+            Vehicle.expiry_date < date.today()
+        ))
+
+    entries = []
+    for vehicle in vehicles:
+        vehicle_unpaid = unpaid.get(vehicle.id, [])
+        entry = HotlistEntry(
+            vehicle_id=vehicle.id,
+            plate_number=vehicle.plate_number,
+            vehicle_status=vehicle.status,
+            expiry_date=vehicle.expiry_date,
+            outstanding_amount=sum((owed for _, _, owed in vehicle_unpaid), 0.0),
+            unpaid=tuple((status, due_date) for status, due_date, _ in vehicle_unpaid)
+        )
+        if entry.alert(datetime.utcnow()):
+            entries.append(entry)
+    return entries
+
+class Hotlist:
+    """Flagged plates keyed by normalized plate, loaded on first use and kept in sync with writes"""
+
+    def __init__(self):
+        self._entries = {}  # normalized plate -> HotlistEntry
+        self._plates = {}  # vehicle id -> normalized plate
+        self._loaded_on = None
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    def ensure_loaded(self):
+        # Registrations expire at midnight without any write, so reload daily
+        if self._loaded_on != date.today():
+            self.reload()
+
+    def reload(self):
+        db = SessionLocal()
+        try:
+            entries = load_entries(db)
+        finally:
+            db.close()
+        with self._lock:
+            self._entries = {normalize_plate_number(e.plate_number): e for e in entries}
+            self._plates = {e.vehicle_id: normalize_plate_number(e.plate_number) for e in entries}
+            self._loaded_on = date.today()
+
+    def alert(self, plate: str) -> Optional[dict]:
+        """Alert block for a plate, or None when it is not flagged"""
+        self.ensure_loaded()
+        entry = self._entries.get(normalize_plate_number(plate))
+        return entry.alert(datetime.utcnow()) if entry else None
+
+    def alerts(self) -> List[dict]:
+        """Alert blocks for every flagged plate"""
+        self.ensure_loaded()
+        now = datetime.utcnow()
+        with self._lock:
+            entries = list(self._entries.values())
+        return [alert for alert in (entry.alert(now) for entry in entries) if alert]
+
+    def refresh_vehicles(self, vehicle_ids):
+        """Recompute the entries of the given vehicles after a write"""
+        if self._loaded_on is None or not vehicle_ids:
+            return
+        db = SessionLocal()
+        try:
+            entries = load_entries(db, list(vehicle_ids))
+        finally:
+            db.close()
+        with self._lock:
+            for vehicle_id in vehicle_ids:
+                plate = self._plates.pop(vehicle_id, None)
+                if plate is not None:
+                    self._entries.pop(plate, None)
+            for entry in entries:
+                plate = normalize_plate_number(entry.plate_number)
+                self._entries[plate] = entry
+                self._plates[entry.vehicle_id] = plate
+            self.updates += 1
+
+    def refresh_plates(self, normalized_plates):
+        """Registry listener: recompute vehicles whose plate, status or expiry changed"""
+        if self._loaded_on is None:
+            return
+        with self._lock:
+            vehicle_ids = {e.vehicle_id for plate, e in self._entries.items() if plate in normalized_plates}
+        db = SessionLocal()
+        try:
+            for chunk in chunked(normalized_plates):
+                vehicle_ids.update(
+                    vehicle_id for (vehicle_id,) in
+                    db.query(Vehicle.id).filter(Vehicle.normalized_plate.in_(chunk))
+                )
+        finally:
+            db.close()
+        self.refresh_vehicles(vehicle_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "flagged_plates": len(self._entries),
+                "loaded_on": self._loaded_on.isoformat() if self._loaded_on else None,
+                "updates": self.updates
+            }
+
+hotlist = Hotlist()
+registry_listeners.append(hotlist.refresh_plates)
+
+# ==================== Incremental updates ====================
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_hotlist_changes(session, flush_context, instances):
+    """Remember which vehicles are affected by violation and payment writes in this session"""
+    vehicles = session.info.setdefault("hotlist_vehicles", set())
+    violations = session.info.setdefault("hotlist_violations", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Violation):
+            vehicles.add(obj.vehicle_id)
+            # A violation moved to another vehicle clears the old one too
+            vehicles.update(inspect(obj).attrs.vehicle_id.history.deleted)
+        elif isinstance(obj, Payment):
+            violations.add(obj.violation_id)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _refresh_hotlist(session):
+    vehicles = session.info.pop("hotlist_vehicles", set())
+    violations = session.info.pop("hotlist_violations", set())
+    vehicles.discard(None)
+    violations.discard(None)
+    if not (vehicles or violations) or (hotlist._loaded_on is None and not hotlist_listeners):
+        return
+    if violations:
+        db = SessionLocal()
+        try:
+            for chunk in chunked(violations):
+                vehicles.update(
+                    vehicle_id for (vehicle_id,) in
+                    db.query(Violation.vehicle_id).filter(Violation.id.in_(chunk))
+                )
+        finally:
+            db.close()
+    vehicles.discard(None)
+    hotlist.refresh_vehicles(vehicles)
+    if vehicles:
+        for listener in hotlist_listeners:
+            listener(vehicles)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_hotlist_changes(session):
+    session.info.pop("hotlist_vehicles", None)
+    session.info.pop("hotlist_violations", None)
@@ -0,0 +1,178 @@
+"""
+Content-addressed evidence image store
+Detection images are kept as sent, named by the hash of their bytes and
+sharded into two directory levels (uploads/ab/cd/abcd....jpg), so the same
+frame is stored once however often it is detected. Files are written by a
+background thread off the request path; thumbnails are generated the first
+time they are viewed and cached next to the originals.
+"""
+
+import os
+import io
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from PIL import Image, UnidentifiedImageError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+IMAGE_STORE = os.getenv("IMAGE_STORE", "true").lower() == "true"
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "uploads")
+# Images waiting to be written before new ones are dropped instead of queued
+IMAGE_STORE_MAX_PENDING = int(os.getenv("IMAGE_STORE_MAX_PENDING", "256"))
+# Longest side of generated thumbnails
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+
+THUMBNAIL_DIR = "thumbs"
+
+# Stored path: <shard>/<shard>/<hash>.<ext>, as kept in DetectionLog.image_path
+STORED_PATH = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{40}\.(jpg|png|gif|bmp|webp)$")
+
+def image_extension(contents: bytes) -> Optional[str]:
+    """File extension for the image format in `contents`, or None if it is not an image we accept"""
+    if contents[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if contents[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if contents[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if contents[:2] == b"BM":
+        return "bmp"
+    if contents[:4] == b"RIFF" and contents[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.blake2b(contents, digest_size=20).hexdigest()
+
+class ImageStore:
+    """Deduplicating, sharded image store with asynchronous writes"""
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, max_pending: int = IMAGE_STORE_MAX_PENDING):
+        self.root = root
+        self.max_pending = max_pending
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+        self._pending = {}  # stored path -> bytes not yet on disk
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        self.dropped = 0
+
+    def _full_path(self, path: str, thumbnail: bool = False) -> str:
+        if thumbnail:
+            path = os.path.splitext(path)[0] + ".jpg"
+            return os.path.join(self.root, THUMBNAIL_DIR, path)
+        return os.path.join(self.root, path)
+
+    def save(self, contents: bytes) -> Optional[str]:
+        """Queue an image for storage and return its stored path
+
+        Returns at once: the file is written in the background, and not at
+        all if the same bytes are already stored or queued. Returns None for
+        data that is not an image, or when too many writes are pending.
+        """
+        extension = image_extension(contents)
+        if extension is None:
+            return None
+        digest = content_hash(contents)
+        path = f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+        with self._lock:
+            if path in self._pending or os.path.exists(self._full_path(path)):
+                self.duplicates += 1
+                return path
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return None
+            self._pending[path] = contents
+        self._writer.submit(self._write, path, contents)
+        return path
+
+    def _write(self, path: str, contents: bytes):
+        full_path = self._full_path(path)
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Write to a temporary name first so a half-written file is never
+            # served (unique per process, since server workers share the store)
+            tmp_path = f"{full_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(contents)
+            os.replace(tmp_path, full_path)
+            with self._lock:
+                self.stored += 1
+        except OSError as e:
+            print(f"Could not store image {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def read(self, path: str) -> Optional[bytes]:
+        """Bytes of a stored image, including ones still waiting to be written"""
+        if not STORED_PATH.match(path or ""):
+            return None
+        with self._lock:
+            contents = self._pending.get(path)
+        if contents is not None:
+            return contents
+        try:
+            with open(self._full_path(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def thumbnail(self, path: str, size: int = THUMBNAIL_SIZE) -> Optional[bytes]:
+        """JPEG thumbnail of a stored image, generated and cached on first use"""
+        if not STORED_PATH.match(path or ""):
+            return None
+        thumbnail_path = self._full_path(path, thumbnail=True)
+        try:
+            with open(thumbnail_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        contents = self.read(path)
+        if contents is None:
+            return None
+        try:
+            img = Image.open(io.BytesIO(contents))
+            # Let the JPEG decoder skip detail the thumbnail does not need
+            img.draft("RGB", (size, size))
+            img = img.convert("RGB")
+            img.thumbnail((size, size))
+        except (UnidentifiedImageError, OSError):
+            # Stored before undecodable images were rejected
+            return None
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=80, optimize=True)
+        thumbnail = buffer.getvalue()
+
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        tmp_path = f"{thumbnail_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, thumbnail_path)
+        return thumbnail
+
+    def flush(self):
+        """Wait for queued writes to finish (on shutdown)"""
+        self._writer.submit(lambda: None).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "stored": self.stored,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "pending": len(self._pending)
+            }
+
+image_store = ImageStore()
+
+def store_image(contents: bytes) -> Optional[str]:
+    """Queue a detection image for storage when the store is enabled, returning its stored path"""
+    return image_store.save(contents) if IMAGE_STORE else None
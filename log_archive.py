@@ -0,0 +1,267 @@
+"""
+Detection log retention and archive
+Keeps the detection_logs table small: logs older than LOG_RETENTION_DAYS
+are moved into one SQLite file per month under LOG_ARCHIVE_DIR
+(detection_logs_2024_05.db), with the same columns and ids. History
+queries read the live table and whichever monthly partitions overlap the
+requested time range. Logs linked to a violation are kept live.
+
+    python log_archive.py --days 90
+    python log_archive.py --stats
+"""
+
+import os
+import re
+import glob
+import heapq
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows; run a single server process there
+    fcntl = None
+
+from database import engine, SessionLocal, DetectionLog, Violation, create_database_engine, migrate_detection_logs
+
+# Load environment variables
+load_dotenv()
+
+# Age in days at which logs leave the live table (0, the default, keeps everything live)
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "data/archive")
+# How often the server moves expired logs into the archive
+LOG_ARCHIVE_INTERVAL_HOURS = float(os.getenv("LOG_ARCHIVE_INTERVAL_HOURS", "6"))
+
+# Rows moved per transaction, so archiving never holds the write lock for long
+ARCHIVE_BATCH_SIZE = 5000
+
+PARTITION_FILE = re.compile(r"detection_logs_(\d{4})_(\d{2})\.db$")
+
+class LogPartition:
+    """One month of archived detection logs in its own SQLite file"""
+
+    def __init__(self, year: int, month: int, archive_dir: str = LOG_ARCHIVE_DIR):
+        self.year = year
+        self.month = month
+        self.path = os.path.join(archive_dir, f"detection_logs_{year:04d}_{month:02d}.db")
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def start(self) -> datetime:
+        return datetime(self.year, self.month, 1)
+
+    @property
+    def end(self) -> datetime:
+        """First moment after the month"""
+        return datetime(self.year + self.month // 12, self.month % 12 + 1, 1)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    partition_engine = create_database_engine(f"sqlite:///{self.path}")
+                    # Same columns and indexes as the live table (SQLite does
+                    # not enforce its vehicles foreign key across files)
+                    DetectionLog.__table__.create(bind=partition_engine, checkfirst=True)
+                    migrate_detection_logs(partition_engine)
+                    self._engine = partition_engine
+        return self._engine
+
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+def get_partition(year: int, month: int) -> LogPartition:
+    with _partitions_lock:
+        partition = _partitions.get((year, month))
+        if partition is None:
+            partition = _partitions[(year, month)] = LogPartition(year, month)
+        return partition
+
+def list_partitions() -> List[LogPartition]:
+    """Archived months, newest first"""
+    months = []
+    for path in glob.glob(os.path.join(LOG_ARCHIVE_DIR, "detection_logs_*.db")):
+        match = PARTITION_FILE.search(path)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return [get_partition(year, month) for year, month in sorted(months, reverse=True)]
+
+def archive_logs(db: Session, older_than: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move logs detected before `older_than` into their monthly partitions; returns the rows moved
+
+    Rows are copied (INSERT OR IGNORE on their id) and committed to the
+    partition before they are deleted from the live table, so an
+    interrupted run loses nothing and is simply repeated. Logs linked to a
+    violation stay live, and so does the newest log, so SQLite never hands
+    its id out again.
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    linked = select(Violation.detection_log_id).where(Violation.detection_log_id.isnot(None))
+    newest_id = db.query(func.max(DetectionLog.id)).scalar() or 0
+    moved = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(DetectionLog.__table__)
+            .where(DetectionLog.detected_at < older_than)
+            .where(DetectionLog.id > last_id, DetectionLog.id < newest_id)
+            .where(DetectionLog.id.not_in(linked))
+            .order_by(DetectionLog.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            return moved
+        last_id = rows[-1]["id"]
+
+        by_month = {}
+        for row in rows:
+            detected_at = row["detected_at"]
+            by_month.setdefault((detected_at.year, detected_at.month), []).append(dict(row))
+        for (year, month), month_rows in by_month.items():
+            with get_partition(year, month).engine.begin() as conn:
+                conn.execute(insert(DetectionLog.__table__).prefix_with("OR IGNORE"), month_rows)
+
+        db.execute(delete(DetectionLog).where(DetectionLog.id.in_([row["id"] for row in rows])))
+        db.commit()
+        moved += len(rows)
+
+def _filtered(query, start: Optional[datetime], end: Optional[datetime], plate: Optional[str], source: Optional[str]):
+    table = DetectionLog.__table__
+    if start is not None:
+        query = query.where(table.c.detected_at >= start)
+    if end is not None:
+        query = query.where(table.c.detected_at < end)
+    if plate:
+        query = query.where(table.c.plate_number.like(f"%{plate.upper()}%"))
+    if source:
+        query = query.where(table.c.source == source)
+    return query
+
+def query_logs(db: Session, start: datetime = None, end: datetime = None, plate: str = None,
+               source: str = None, skip: int = 0, limit: int = 50) -> List[dict]:
+    """Detection logs from the live table and the archive, newest first
+
+    Partitions outside [start, end) are not opened, and older partitions
+    are skipped once enough newer rows are found.
+    """
+    needed = skip + limit
+    table = DetectionLog.__table__
+    newest_first = select(table).order_by(table.c.detected_at.desc()).limit(needed)
+
+    sources = [
+        [dict(row, archived=False) for row in db.execute(_filtered(newest_first, start, end, plate, source)).mappings()]
+    ]
+    found = list(sources[0])
+    for partition in list_partitions():
+        if (start is not None and partition.end <= start) or (end is not None and partition.start >= end):
+            continue
+        # Every remaining partition is older than the rows already found
+        if len(found) >= needed and sorted(r["detected_at"] for r in found)[-needed] >= partition.end:
+            break
+        with partition.engine.connect() as conn:
+            rows = [dict(row, archived=True) for row in conn.execute(_filtered(newest_first, start, end, plate, source)).mappings()]
+        sources.append(rows)
+        found.extend(rows)
+
+    merged = heapq.merge(*sources, key=lambda r: r["detected_at"], reverse=True)
+    return list(merged)[skip:needed]
+
+def get_log(db: Session, log_id: int) -> Optional[dict]:
+    """One detection log by id, live or archived"""
+    table = DetectionLog.__table__
+    by_id = select(table).where(table.c.id == log_id)
+    row = db.execute(by_id).mappings().first()
+    if row is not None:
+        return dict(row, archived=False)
+    for partition in list_partitions():
+        with partition.engine.connect() as conn:
+            row = conn.execute(by_id).mappings().first()
+        if row is not None:
+            return dict(row, archived=True)
+    return None
+
+def archive_stats(db: Session) -> dict:
+    partitions = []
+    for partition in list_partitions():
+        with partition.engine.connect() as conn:
+            rows = conn.execute(select(func.count()).select_from(DetectionLog.__table__)).scalar()
+        partitions.append({
+            "month": f"{partition.year:04d}-{partition.month:02d}",
+            "rows": rows,
+            "size_bytes": os.path.getsize(partition.path)
+        })
+    return {
+        "retention_days": LOG_RETENTION_DAYS,
+        "live_rows": db.query(func.count(DetectionLog.id)).scalar(),
+        "partitions": partitions
+    }
+
+def run_retention() -> int:
+    """Archive every log past LOG_RETENTION_DAYS
+
+    With several server workers only the one holding the archive lock file
+    runs; the others return 0 straight away.
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(LOG_ARCHIVE_DIR, ".archive.lock"), "w") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+        db = SessionLocal()
+        try:
+            return archive_logs(db, datetime.utcnow() - timedelta(days=LOG_RETENTION_DAYS))
+        finally:
+            db.close()
+
+async def retention_loop():
+    """Archive expired logs every LOG_ARCHIVE_INTERVAL_HOURS while the server runs"""
+    while True:
+        try:
+            moved = await run_in_threadpool(run_retention)
+            if moved:
+                print(f"Archived {moved} detection logs older than {LOG_RETENTION_DAYS} days")
+        except Exception as e:
+            print(f"Detection log archiving failed: {e}")
+        await asyncio.sleep(LOG_ARCHIVE_INTERVAL_HOURS * 3600)
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old detection logs into monthly archive files")
+    parser.add_argument("--days", type=int, default=LOG_RETENTION_DAYS or None,
+                        help="Archive logs older than this many days (default: LOG_RETENTION_DAYS)")
+    parser.add_argument("--stats", action="store_true", help="Only show the live row count and partitions")
+    parser.add_argument("--vacuum", action="store_true", help="Compact the main database after archiving")
+    args = parser.parse_args()
+    if not args.stats and not args.days:
+        parser.error("--days is required when LOG_RETENTION_DAYS is not set")
+
+    db = SessionLocal()
+    try:
+        if not args.stats:
+            moved = archive_logs(db, datetime.utcnow() - timedelta(days=args.days))
+            print(f"Archived {moved} detection logs older than {args.days} days")
+            if args.vacuum and moved:
+                # Give the freed pages back to the filesystem; locks the database while it runs
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.exec_driver_sql("VACUUM")
+        stats = archive_stats(db)
+    finally:
+        db.close()
+
+    print(f"Live detection logs: {stats['live_rows']}")
+    for partition in stats["partitions"]:
+        print(f"  {partition['month']}: {partition['rows']} rows, {partition['size_bytes'] / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
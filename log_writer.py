@@ -0,0 +1,281 @@
+"""
+Write-behind DetectionLog writer
+Detections hand their log rows to a buffer instead of committing them one
+request at a time; a background thread writes the buffer as one bulk
+insert every LOG_FLUSH_ROWS rows or LOG_FLUSH_MS milliseconds, whichever
+comes first. One commit (one SQLite fsync) then covers many detections.
+
+Repeat reads of a plate from the same camera within LOG_DEDUPE_WINDOW_SECONDS
+of its last sighting do not add rows: they bump hit_count and last_seen_at
+on the plate's existing row, found in an in-memory index of recent plates,
+and replace its read when they are more confident.
+"""
+
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import List
+from sqlalchemy import insert, update, bindparam
+from dotenv import load_dotenv
+from database import SessionLocal, DetectionLog, normalize_plate_number
+
+# Load environment variables
+load_dotenv()
+
+# false writes every detection's rows synchronously, as before
+LOG_WRITE_BEHIND = os.getenv("LOG_WRITE_BEHIND", "true").lower() == "true"
+LOG_FLUSH_ROWS = int(os.getenv("LOG_FLUSH_ROWS", "200"))
+LOG_FLUSH_MS = float(os.getenv("LOG_FLUSH_MS", "250"))
+# Rows buffered at most; past that, callers write their rows themselves
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+# Repeat reads of a plate from one source within this many seconds of the
+# last one update that row instead of adding one (0 disables)
+LOG_DEDUPE_WINDOW_SECONDS = float(os.getenv("LOG_DEDUPE_WINDOW_SECONDS", "60"))
+# Sources whose repeat reads are merged. Uploads and manual entries are
+# deliberate and always logged; video ingestion already logs each pass of
+# a plate once, stamped with ingestion time rather than frame time
+LOG_DEDUPE_SOURCES = {s.strip() for s in os.getenv("LOG_DEDUPE_SOURCES", "camera,live").split(",") if s.strip()}
+# Recently seen (source, plate) pairs kept in memory at most
+LOG_DEDUPE_MAX_PLATES = 100000
+
+# Columns taken from a more confident repeat read
+BEST_READ_COLUMNS = ("plate_number", "detected_text", "confidence", "vehicle_id", "image_path")
+
+# Where a row is in its life: waiting in the buffer, being inserted, or in the table
+BUFFERED, INSERTING, WRITTEN = range(3)
+
+class PendingLog:
+    """A DetectionLog row on its way to the table, with its running hit count"""
+
+    __slots__ = ("row", "id", "hit_count", "last_seen_at", "state")
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.id = None
+        self.hit_count = 1
+        self.last_seen_at = row["detected_at"]
+        self.state = BUFFERED
+
+    def params(self) -> dict:
+        return {**self.row, "hit_count": self.hit_count, "last_seen_at": self.last_seen_at}
+
+class DetectionLogWriter:
+    """Buffers DetectionLog rows (column dicts) and bulk-inserts them from a background thread
+
+    When the buffer is full the caller's rows are written synchronously
+    instead (counted as overflows), so a stalled database slows detection
+    down rather than losing logs.
+    """
+
+    def __init__(self, flush_rows: int = LOG_FLUSH_ROWS, flush_ms: float = LOG_FLUSH_MS,
+                 max_queued: int = LOG_QUEUE_MAX, write_behind: bool = LOG_WRITE_BEHIND,
+                 dedupe_window: float = LOG_DEDUPE_WINDOW_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_ms / 1000
+        self.max_queued = max_queued
+        self.write_behind = write_behind
+        self.dedupe_window = timedelta(seconds=dedupe_window)
+        self._rows = []
+        # Rows already inserted (or being inserted) whose hits changed since
+        self._touched = set()
+        # (source, source key, normalized plate) -> PendingLog, least recently seen first
+        self._recent = OrderedDict()
+        self._first_queued = None
+        self._condition = threading.Condition()
+        # Held while rows are being written, so flush() can wait for the thread
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.written = 0
+        self.flushes = 0
+        self.overflows = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.deduplicated = 0
+
+    def add(self, rows: List[dict], source_key: str = None):
+        """Queue rows for the next flush
+
+        `source_key` tells apart cameras sharing a source for deduplication.
+        """
+        if not rows:
+            return
+        with self._condition:
+            new = [entry for entry in (self._merge(row, source_key) for row in rows) if entry]
+            if not new and not self._touched:
+                return
+            if self.write_behind and not self._closed:
+                if len(self._rows) + len(new) <= self.max_queued:
+                    # Wake the thread to start the flush timer, or to flush a full buffer
+                    wake = self._first_queued is None or len(self._rows) + len(new) >= self.flush_rows
+                    if self._first_queued is None:
+                        self._first_queued = time.monotonic()
+                    self._rows.extend(new)
+                    self.max_depth = max(self.max_depth, len(self._rows))
+                    self._ensure_started()
+                    if wake:
+                        self._condition.notify()
+                    return
+                self.overflows += 1
+        self._write(new)
+
+    def _merge(self, row: dict, source_key: str = None):
+        """Fold a repeat read into the plate's recent row; returns a new PendingLog otherwise (lock held)"""
+        if not self.dedupe_window or row["source"] not in LOG_DEDUPE_SOURCES:
+            return PendingLog(row)
+
+        key = (row["source"], source_key, normalize_plate_number(row["plate_number"]))
+        seen_at = row["detected_at"]
+        # Forget plates not seen within the window
+        while self._recent:
+            oldest = next(iter(self._recent.values()))
+            if seen_at - oldest.last_seen_at <= self.dedupe_window and len(self._recent) < LOG_DEDUPE_MAX_PLATES:
+                break
+            self._recent.popitem(last=False)
+
+        entry = self._recent.get(key)
+        if entry is not None and entry.state is not None:
+            entry.hit_count += 1
+            entry.last_seen_at = seen_at
+            if row["confidence"] > entry.row["confidence"]:
+                # Keep the best read; a frame that was not stored keeps the old evidence
+                best = {column: row[column] for column in BEST_READ_COLUMNS if column in row}
+                if best.get("image_path") is None:
+                    best.pop("image_path", None)
+                entry.row = {**entry.row, **best}
+            self._recent.move_to_end(key)
+            self.deduplicated += 1
+            # Buffered rows are inserted with their latest count anyway
+            if entry.state != BUFFERED:
+                self._touched.add(entry)
+            return None
+
+        entry = self._recent[key] = PendingLog(row)
+        return entry
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="detection-log-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self, entries: List[PendingLog] = None):
+        """Snapshot rows to insert (the buffer by default) and the hit updates that can be written now (lock held)"""
+        if entries is None:
+            entries, self._rows, self._first_queued = self._rows, [], None
+        for entry in entries:
+            entry.state = INSERTING
+        # Rows still being inserted get their update on the next flush;
+        # rows that failed to insert never will
+        self._touched = {entry for entry in self._touched if entry.state is not None}
+        touched = [entry for entry in self._touched if entry.id is not None]
+        self._touched.difference_update(touched)
+        if self._touched and self._first_queued is None:
+            self._first_queued = time.monotonic()
+        return (
+            entries,
+            [entry.params() for entry in entries],
+            [{"row_id": e.id, "hits": e.hit_count, "seen": e.last_seen_at,
+              **{f"best_{column}": e.row.get(column) for column in BEST_READ_COLUMNS}} for e in touched]
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if len(self._rows) >= self.flush_rows:
+                        break
+                    if self._rows or self._touched:
+                        remaining = self._first_queued + self.flush_seconds - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write(self, entries: List[PendingLog]):
+        """Write rows (and pending hit updates) synchronously"""
+        with self._write_lock:
+            with self._condition:
+                batch = self._take(entries)
+            self._insert(*batch)
+
+    def _insert(self, entries: List[PendingLog], rows: List[dict], hits: List[dict]):
+        if not rows and not hits:
+            return
+        db = SessionLocal()
+        try:
+            ids = []
+            if rows:
+                ids = db.execute(
+                    insert(DetectionLog).returning(DetectionLog.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+            if hits:
+                db.execute(
+                    update(DetectionLog.__table__)
+                    .where(DetectionLog.__table__.c.id == bindparam("row_id"))
+                    .values(hit_count=bindparam("hits"), last_seen_at=bindparam("seen"),
+                            **{column: bindparam(f"best_{column}") for column in BEST_READ_COLUMNS}),
+                    hits
+                )
+            db.commit()
+            with self._condition:
+                for entry, row_id in zip(entries, ids):
+                    entry.id = row_id
+                    entry.state = WRITTEN
+            self.written += len(rows)
+            self.flushes += 1
+        except Exception as e:
+            db.rollback()
+            # Lost rows can no longer take repeat reads
+            with self._condition:
+                for entry in entries:
+                    entry.state = None
+            self.failed += len(rows)
+            print(f"Could not write {len(rows)} detection logs: {e}")
+        finally:
+            db.close()
+
+    def flush(self):
+        """Write everything buffered so far and wait until it is committed"""
+        # Lock order is always write lock, then buffer
+        with self._write_lock:
+            with self._condition:
+                batch = self._take()
+            self._insert(*batch)
+
+    def close(self):
+        """Stop the background thread after writing the buffer (on shutdown)"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "write_behind": self.write_behind,
+                "queued": len(self._rows),
+                "max_queued": self.max_queued,
+                "max_depth": self.max_depth,
+                "written": self.written,
+                "flushes": self.flushes,
+                "rows_per_flush": round(self.written / self.flushes, 1) if self.flushes else 0.0,
+                "overflows": self.overflows,
+                "failed": self.failed,
+                "dedupe_window_seconds": self.dedupe_window.total_seconds(),
+                "deduplicated": self.deduplicated,
+                "recent_plates": len(self._recent)
+            }
+
+log_writer = DetectionLogWriter()
+# Scripts (video ingestion, seeding) exit without an app shutdown event
+atexit.register(log_writer.close)
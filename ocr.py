@@ -0,0 +1,278 @@
+"""
+OCR stage of the plate detection pipeline
+Runs the Tesseract passes concurrently in a bounded worker pool so a
+detection costs about as long as its slowest pass and the event loop
+stays free while OCR runs. The engine behind each pass is pluggable:
+a persistent in-process libtesseract engine (tesserocr) when available,
+otherwise the tesseract CLI through pytesseract.
+"""
+
+import os
+import re
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Tuple
+import numpy as np
+import pytesseract
+from dotenv import load_dotenv
+
+try:
+    import tesserocr
+except ImportError:  # Optional dependency, see requirements.txt
+    tesserocr = None
+
+# Load environment variables
+load_dotenv()
+
+# Number of OCR passes allowed to run at once across all requests
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+# auto, tesserocr or pytesseract
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Each pass already gets its own core from the pool; stop Tesseract from
+# also spreading every pass over all cores with OpenMP
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Tesseract configurations tried on the preprocessed image
+OCR_CONFIGS = [
+    '--psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    '--psm 13',
+    '--psm 11',
+]
+
+# Full-frame passes grouped into early-exit cascade stages, cheapest first.
+# The whitelisted single word/line passes skip page layout analysis; the
+# raw-line, sparse-text and automatic-layout (original image) passes do
+# not. Passes within a stage run in parallel. Each pass is
+# (config, run on the original image instead of the preprocessed one).
+FULL_FRAME_STAGES = [
+    [(OCR_CONFIGS[0], False), (OCR_CONFIGS[1], False)],
+    [(OCR_CONFIGS[2], False), (OCR_CONFIGS[3], False), ("", True)],
+]
+
+# Passes run on each localized plate crop: a crop holds a single line of
+# plate text, so the sparse/raw-line modes used on whole frames are not needed
+ROI_OCR_CONFIGS = [
+    '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    '--psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+]
+
+# Both backends release the GIL while Tesseract works (pytesseract waits
+# on a subprocess, tesserocr calls into C++), so threads are enough to run
+# passes in parallel
+_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+
+# ==================== OCR Backends ====================
+
+@dataclass
+class OCRRead:
+    """Text of one pass and the confidence (0-100) of each whitespace-separated word in it"""
+    text: str = ""
+    word_confidences: List[float] = field(default_factory=list)
+    failed: bool = False  # The pass raised instead of reading the image
+
+class OCRBackend(ABC):
+    """Runs one Tesseract pass on a numpy image"""
+    name = "base"
+
+    @abstractmethod
+    def image_to_string(self, image: np.ndarray, config: str = "") -> str:
+        """Text of one pass"""
+
+    @abstractmethod
+    def image_to_data(self, image: np.ndarray, config: str = "") -> OCRRead:
+        """Text of one pass with word confidences"""
+
+class PytesseractBackend(OCRBackend):
+    """Tesseract CLI through pytesseract: one process spawn and model load per pass"""
+    name = "pytesseract"
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+
+    def image_to_string(self, image, config=""):
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def image_to_data(self, image, config=""):
+        data = pytesseract.image_to_data(image, lang=self.lang, config=config, output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            word = word.strip()
+            # Layout rows (blocks, lines) carry conf -1 and no text
+            if not word or float(data["conf"][i]) < 0:
+                continue
+            line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(line, []).append(word)
+            confidences.append(float(data["conf"][i]))
+        return OCRRead("\n".join(" ".join(words) for words in lines.values()), confidences)
+
+def parse_tesseract_config(config: str) -> Tuple[int, dict]:
+    """Split a tesseract CLI config string into a page segmentation mode and -c variables"""
+    psm = re.search(r'--psm\s+(\d+)', config)
+    variables = dict(re.findall(r'-c\s+([^=\s]+)=(\S*)', config))
+    return (int(psm.group(1)) if psm else 3), variables
+
+class TesserocrBackend(OCRBackend):
+    """In-process libtesseract through tesserocr
+
+    Every worker thread keeps its own engine with the language model loaded,
+    and images are handed over as raw numpy buffers, so a pass costs no
+    process spawn, temp file or model load.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang: str = OCR_LANG):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.lang = lang
+        self._local = threading.local()
+        # Fail now rather than on the first request if the model is missing
+        self._engine()
+
+    def _engine(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+            self._local.defaults = {}
+        return api
+
+    def image_to_string(self, image, config=""):
+        api = self._prepare(image, config)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, image, config=""):
+        api = self._prepare(image, config)
+        text = api.GetUTF8Text()
+        confidences = [float(c) for c in api.AllWordConfidences()]
+        if len(confidences) != len(text.split()):
+            # Should not happen, but never attribute a confidence to the wrong word
+            confidences = [float(api.MeanTextConf())] * len(text.split())
+        return OCRRead(text, confidences)
+
+    def _prepare(self, image, config):
+        """Configure this thread's engine for a pass and hand it the image"""
+        api = self._engine()
+        psm, variables = parse_tesseract_config(config)
+
+        # Variables persist on the engine, so restore anything a previous
+        # pass changed before applying this pass's config
+        defaults = self._local.defaults
+        for key, value in defaults.items():
+            if key not in variables:
+                api.SetVariable(key, value)
+        for key, value in variables.items():
+            if key not in defaults:
+                defaults[key] = api.GetVariableAsString(key) or ""
+            api.SetVariable(key, value)
+        api.SetPageSegMode(psm)
+
+        image = np.ascontiguousarray(image)
+        if image.ndim == 3:
+            # OpenCV images are BGR, Tesseract expects RGB
+            image = np.ascontiguousarray(image[:, :, ::-1])
+            bytes_per_pixel = image.shape[2]
+        else:
+            bytes_per_pixel = 1
+        height, width = image.shape[:2]
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        return api
+
+OCR_BACKENDS = {
+    "tesserocr": TesserocrBackend,
+    "pytesseract": PytesseractBackend,
+}
+
+def create_backend(name: str = OCR_BACKEND) -> OCRBackend:
+    """Create the configured backend, falling back to pytesseract when tesserocr is unusable"""
+    if name == "auto":
+        name = "tesserocr" if tesserocr is not None else "pytesseract"
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}', expected one of {', '.join(OCR_BACKENDS)}")
+    try:
+        return OCR_BACKENDS[name]()
+    except Exception as e:
+        if name == "pytesseract":
+            raise
+        print(f"Warning: OCR backend '{name}' unavailable ({e}), falling back to pytesseract")
+        return PytesseractBackend()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> OCRBackend:
+    """Return the process-wide OCR backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def run_ocr_pass(image, config: str = "", backend: OCRBackend = None) -> OCRRead:
+    """Run a single Tesseract pass with word confidences, returning an empty failed read if it fails"""
+    try:
+        return (backend or get_backend()).image_to_data(image, config=config)
+    except Exception:
+        return OCRRead(failed=True)
+
+def pass_name(config: str) -> str:
+    """Short name of a pass for timings, e.g. psm8 (auto for Tesseract's default layout)"""
+    psm = re.search(r"--psm\s+(\d+)", config)
+    return f"psm{psm.group(1)}" if psm else "auto"
+
+def _timed_pass(image, config: str) -> Tuple[OCRRead, float]:
+    start = time.perf_counter()
+    read = run_ocr_pass(image, config)
+    return read, (time.perf_counter() - start) * 1000
+
+async def run_passes(passes, timer=None, prefix: str = "ocr") -> List[OCRRead]:
+    """Run (image, config) passes concurrently in the OCR pool, returning their reads in order
+
+    With a StageTimer, each pass's time is recorded as <prefix>-<pass name>.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [loop.run_in_executor(_executor, _timed_pass, image, config) for image, config in passes]
+    reads = []
+    for (_, config), (read, ms) in zip(passes, await asyncio.gather(*tasks)):
+        if timer is not None:
+            timer.add(f"{prefix}-{pass_name(config)}", ms)
+        reads.append(read)
+    return reads
+
+async def run_stage(stage, processed_image, image, timer=None) -> List[OCRRead]:
+    """Run one FULL_FRAME_STAGES stage on a frame"""
+    return await run_passes([(image if on_original else processed_image, config) for config, on_original in stage], timer)
+
+async def run_roi_ocr_passes(regions, timer=None) -> List[OCRRead]:
+    """Run the plate-crop passes on every localized region"""
+    return await run_passes([(region, config) for region in regions for config in ROI_OCR_CONFIGS], timer, "roi")
+
+def warm_up(timeout: float = 30) -> int:
+    """Start the OCR backend in every pool thread before the first request; returns the threads warmed
+
+    Each task holds its thread at a barrier until all of them are running,
+    so every thread gets exactly one pass (and its own tesserocr engine).
+    """
+    blank = np.full((40, 160), 255, np.uint8)
+    barrier = threading.Barrier(OCR_WORKERS)
+
+    def start_engine():
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass
+        run_ocr_pass(blank, ROI_OCR_CONFIGS[0])
+        return threading.get_ident()
+
+    get_backend()
+    futures = [_executor.submit(start_engine) for _ in range(OCR_WORKERS)]
+    return len({future.result() for future in futures})
@@ -0,0 +1,156 @@
+"""
+OCR result cache for the plate detection pipeline
+Remembers the plate candidates read from an image, keyed by a hash of the
+decoded pixels and the pipeline fingerprint, so re-submitted photos and
+repeated camera frames skip OCR entirely. Entries are bounded by count and
+age and can optionally be persisted in the ocr_cache table.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from database import SessionLocal, OCRCacheEntry
+
+# Load environment variables
+load_dotenv()
+
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "2000"))
+OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", "3600"))
+# Keep cached results in the database so they survive restarts
+OCR_CACHE_PERSIST = os.getenv("OCR_CACHE_PERSIST", "false").lower() == "true"
+
+def image_key(image: np.ndarray, fingerprint: str) -> str:
+    """Hash the decoded pixels together with the pipeline that read them"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(fingerprint.encode())
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+class OCRResultCache:
+    """Thread-safe LRU + TTL cache of plate candidate lists"""
+
+    def __init__(self, max_size: int = OCR_CACHE_SIZE, ttl: int = OCR_CACHE_TTL_SECONDS,
+                 persist: bool = OCR_CACHE_PERSIST):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist = persist
+        self._entries = OrderedDict()  # key -> (stored_at, candidates)
+        self._lock = threading.Lock()
+        self._loaded = not persist
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Return a copy of the cached candidates, or None"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(plate) for plate in entry[1]]
+
+    def put(self, key: str, candidates: List[dict]):
+        """Cache the candidates read from an image (blocking when persistence is on)"""
+        stored_at = time.time()
+        self._store(key, stored_at, [dict(plate) for plate in candidates])
+        # A cache of size 0 keeps nothing, in memory or in the table
+        if self.persist and self.max_size:
+            self._persist(key, candidates)
+
+    def _store(self, key: str, stored_at: float, candidates: List[dict]):
+        with self._lock:
+            self._entries[key] = (stored_at, candidates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _persist(self, key: str, candidates: List[dict]):
+        db = SessionLocal()
+        try:
+            db.merge(OCRCacheEntry(key=key, candidates=json.dumps(candidates), created_at=datetime.utcnow()))
+            db.commit()
+            self._writes += 1
+            if self._writes % self.max_size == 0:
+                self._prune(db)
+        except Exception as e:
+            db.rollback()
+            print(f"OCR cache persist error: {e}")
+        finally:
+            db.close()
+
+    def _prune(self, db):
+        """Delete expired rows and everything beyond the newest max_size"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        db.query(OCRCacheEntry).filter(OCRCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+        newest = db.query(OCRCacheEntry.created_at).order_by(OCRCacheEntry.created_at.desc()).offset(self.max_size).limit(1).scalar()
+        if newest is not None:
+            db.query(OCRCacheEntry).filter(OCRCacheEntry.created_at <= newest).delete(synchronize_session=False)
+        db.commit()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+        db = SessionLocal()
+        try:
+            self._prune(db)
+            rows = db.query(OCRCacheEntry).order_by(OCRCacheEntry.created_at).all()
+            for row in rows:
+                stored_at = (row.created_at - datetime.utcnow()).total_seconds() + time.time()
+                self._store(row.key, stored_at, json.loads(row.candidates))
+        except Exception as e:
+            print(f"OCR cache load error: {e}")
+        finally:
+            db.close()
+
+    def clear(self):
+        """Drop every cached result, including persisted ones"""
+        with self._lock:
+            self._entries.clear()
+        if self.persist:
+            db = SessionLocal()
+            try:
+                db.query(OCRCacheEntry).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "persist": self.persist,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+ocr_cache = OCRResultCache()
@@ -0,0 +1,203 @@
+"""
+Plate registry cache for the plate detection pipeline
+Keeps ready-made vehicle + owner summaries keyed by normalized plate so
+detections do not need a database round trip for every candidate
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+from dotenv import load_dotenv
+from database import SessionLocal, Owner, Vehicle, normalize_plate_number, chunked
+
+# Load environment variables
+load_dotenv()
+
+# Maximum number of plates (registered or not) kept in memory
+PLATE_CACHE_SIZE = int(os.getenv("PLATE_CACHE_SIZE", "50000"))
+
+# Returned by PlateRegistryCache.get when the plate has not been cached yet
+MISS = object()
+
+# Callables notified with the set of normalized plates touched by each
+# committed registry write (other in-process indexes keep in sync this way)
+registry_listeners = []
+
+class PlateRegistryCache:
+    """Thread-safe LRU cache of vehicle summaries keyed by normalized plate
+
+    Plates that are not registered are cached as None so repeated OCR
+    misreads do not keep hitting the database.
+    """
+
+    def __init__(self, max_size: int = PLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a lookup that raced with a write
+        # does not put a stale summary back into the cache
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, normalized_plate: str):
+        """Return the cached summary (or None for unregistered plates), or MISS"""
+        with self._lock:
+            if normalized_plate in self._entries:
+                self._entries.move_to_end(normalized_plate)
+                self.hits += 1
+                return self._entries[normalized_plate]
+            self.misses += 1
+            return MISS
+
+    def put(self, normalized_plate: str, summary, generation: int = None):
+        """Cache a summary unless the registry changed since `generation`"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[normalized_plate] = summary
+            self._entries.move_to_end(normalized_plate)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, normalized_plates):
+        """Drop the given plates from the cache"""
+        with self._lock:
+            self._generation += 1
+            for plate in normalized_plates:
+                if self._entries.pop(plate, MISS) is not MISS:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every cached plate"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+registry_cache = PlateRegistryCache()
+
+def vehicle_summary(vehicle: Vehicle) -> dict:
+    """Build the vehicle + owner payload returned with detections"""
+    owner = vehicle.owner
+    return {
+        "vehicle_id": vehicle.id,
+        "plate_number": vehicle.plate_number,
+        "vehicle_info": {
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "year": vehicle.year,
+            "color": vehicle.color,
+            "status": vehicle.status,
+            "owner": {
+                "name": f"{owner.first_name} {owner.last_name}",
+                "email": owner.email,
+                "phone": owner.phone,
+                "city": owner.city,
+                "state": owner.state
+            }
+        }
+    }
+
+def lookup_vehicle(db: Session, plate):
+    """Return the cached summary for a plate, loading it on a cache miss
+
+    The result is shared between requests and must not be modified.
+    """
+    normalized = normalize_plate_number(plate)
+    if not normalized:
+        return None
+
+    summary = registry_cache.get(normalized)
+    if summary is not MISS:
+        return summary
+
+    generation = registry_cache.generation
+    vehicle = db.query(Vehicle).options(joinedload(Vehicle.owner)).filter(
+        Vehicle.normalized_plate == normalized
+    ).first()
+    summary = vehicle_summary(vehicle) if vehicle else None
+    registry_cache.put(normalized, summary, generation)
+    return summary
+
+def lookup_vehicles(db: Session, plates) -> dict:
+    """Return {normalized plate: summary or None} for many plates
+
+    Plates missing from the cache are loaded with IN queries of
+    IN_QUERY_CHUNK_SIZE plates each.
+    """
+    results = {}
+    missing = set()
+    for plate in plates:
+        normalized = normalize_plate_number(plate)
+        if not normalized or normalized in results:
+            continue
+        summary = registry_cache.get(normalized)
+        if summary is MISS:
+            missing.add(normalized)
+        else:
+            results[normalized] = summary
+
+    if missing:
+        generation = registry_cache.generation
+        found = {}
+        for chunk in chunked(missing):
+            vehicles = db.query(Vehicle).options(joinedload(Vehicle.owner)).filter(
+                Vehicle.normalized_plate.in_(chunk)
+            ).all()
+            found.update((v.normalized_plate, vehicle_summary(v)) for v in vehicles)
+        for normalized in missing:
+            summary = found.get(normalized)
+            registry_cache.put(normalized, summary, generation)
+            results[normalized] = summary
+    return results
+
+# ==================== Write-through invalidation ====================
+
+@event.listens_for(SessionLocal, "before_flush")
+def _collect_registry_changes(session, flush_context, instances):
+    """Remember which plates are affected by vehicle/owner writes in this session"""
+    changed = session.info.setdefault("registry_plates", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Vehicle):
+            # Include the previous plate when a vehicle is re-plated
+            history = inspect(obj).attrs.normalized_plate.history
+            changed.update(p for p in history.deleted if p)
+            changed.add(normalize_plate_number(obj.plate_number))
+        elif isinstance(obj, Owner):
+            changed.update(v.normalized_plate for v in obj.vehicles)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_registry_changes(session):
+    changed = session.info.pop("registry_plates", None)
+    if changed:
+        registry_cache.invalidate(changed)
+        for listener in registry_listeners:
+            listener(changed)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_registry_changes(session):
+    session.info.pop("registry_plates", None)
@@ -0,0 +1,275 @@
+"""
+Plate grammar for OCR candidate extraction
+Compiles the plate formats of a region into one automaton and scans OCR
+text with it in a single pass, so only plate-shaped reads (and, optionally,
+registered plates) come out as candidates. Letters and digits that
+Tesseract confuses (O/0, B/8, ...) are decoded by position: an 0 where the
+format expects a letter is read as an O.
+"""
+
+import os
+import re
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+from dotenv import load_dotenv
+from database import normalize_plate_number
+from plate_cache import registry_listeners
+from plate_matcher import CONFUSION_GROUPS, plate_index
+
+# Load environment variables
+load_dotenv()
+
+# Plate formats per region: L = letter, N = digit, a space or hyphen is an
+# optional separator (OCR may read it as any run of spaces/hyphens or drop it)
+PLATE_REGIONS = {
+    # Philippines (LTO): current and previous car series, motorcycle series
+    "PH": ["LLL NNNN", "LLL NNN", "NNN LLL", "NNNN LL", "LL NNNNN"],
+    # Broad fallback close to the patterns used before the grammar
+    "generic": ["LL NNNN", "LLL NNN", "LLL NNNN", "NN LLL NN", "NNN LLL", "NNNN LLL", "L NNN LLL", "LLL NNNN L"],
+}
+
+PLATE_REGION = os.getenv("PLATE_REGION", "PH")
+# Comma-separated formats overriding the region, e.g. "LLL-NNNN,LL-NNNN"
+PLATE_FORMATS = [f.strip() for f in os.getenv("PLATE_FORMATS", "").split(",") if f.strip()]
+# Also accept registered plates that do not fit the region's formats
+PLATE_REGISTRY_DECODING = os.getenv("PLATE_REGISTRY_DECODING", "true").lower() == "true"
+
+# Most characters one candidate may have decoded as the other class; more
+# than that is a misread, not a plate
+MAX_CORRECTIONS = 2
+
+LETTER = "L"
+DIGIT = "N"
+SEPARATOR = " "
+SEPARATOR_CHARS = set(" \t\n-.")
+# Groups of L and N joined by single spaces, hyphens or dots
+FORMAT_PATTERN = re.compile(r"[LN]+(?:[ .-][LN]+)*")
+
+# Each character's reading as the other class, taken from its confusion
+# group (a 0 in a letter position is an O, a B in a digit position an 8)
+_AS_LETTER = {}
+_AS_DIGIT = {}
+for _group in CONFUSION_GROUPS:
+    _letters = [c for c in _group if c.isalpha()]
+    _digits = [c for c in _group if c.isdigit()]
+    for _char in _group:
+        if _char.isdigit() and _letters:
+            _AS_LETTER[_char] = _letters[0]
+        if _char.isalpha() and _digits:
+            _AS_DIGIT[_char] = _digits[0]
+
+def _readings(char: str):
+    """(class, decoded char, corrections) for every way a character can be read"""
+    if "A" <= char <= "Z":
+        yield LETTER, char, 0
+        if char in _AS_DIGIT:
+            yield DIGIT, _AS_DIGIT[char], 1
+    elif "0" <= char <= "9":
+        yield DIGIT, char, 0
+        if char in _AS_LETTER:
+            yield LETTER, _AS_LETTER[char], 1
+
+@dataclass
+class PlateCandidate:
+    text: str  # Decoded plate, formatted like its plate format
+    start: int  # Span in the scanned text
+    end: int
+    corrections: int  # Characters decoded as the other class
+    registered: bool = False
+
+class RegisteredPlatePrefixes:
+    """Prefix lookups over the registered plates
+
+    Acts as a prefix trie of the registry, but stored as one sorted list
+    (prefix checks by bisection) so 300k plates cost a few MB instead of
+    millions of trie nodes. Built from plate_index and kept in sync with
+    registry writes.
+    """
+
+    def __init__(self):
+        self._plates = []
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            plates = sorted(plate_index.plates())
+            with self._lock:
+                self._plates = plates
+                self._loaded = True
+
+    def has_prefix(self, prefix: str) -> bool:
+        plates = self._plates
+        i = bisect.bisect_left(plates, prefix)
+        return i < len(plates) and plates[i].startswith(prefix)
+
+    def __contains__(self, plate: str) -> bool:
+        plates = self._plates
+        i = bisect.bisect_left(plates, plate)
+        return i < len(plates) and plates[i] == plate
+
+    def refresh(self, normalized_plates):
+        """Re-sync the given plates after a registry write (plate_index is refreshed first)"""
+        if not self._loaded:
+            return
+        with self._lock:
+            plates = list(self._plates)
+            for plate in normalized_plates:
+                if not plate:
+                    continue
+                i = bisect.bisect_left(plates, plate)
+                present = i < len(plates) and plates[i] == plate
+                if plate in plate_index and not present:
+                    plates.insert(i, plate)
+                elif present and plate not in plate_index:
+                    del plates[i]
+            self._plates = plates
+
+registered_prefixes = RegisteredPlatePrefixes()
+registry_listeners.append(registered_prefixes.refresh)
+
+class PlateGrammar:
+    """The plate formats of a region compiled into one automaton
+
+    States form a trie over the symbols L, N and separator, shared by all
+    formats; accepting states remember their format. Separators are
+    optional, so scanning follows both the separator edge and the edges
+    behind it, which keeps only a handful of threads alive at a time.
+    """
+
+    def __init__(self, formats: List[str]):
+        invalid = [f for f in formats if not FORMAT_PATTERN.fullmatch(f)]
+        if invalid:
+            print(f"Ignoring invalid plate formats {invalid} (use L, N and one separator, e.g. LLL-NNNN)")
+            formats = [f for f in formats if f not in invalid]
+        if not formats:
+            formats = PLATE_REGIONS.get(PLATE_REGION, PLATE_REGIONS["generic"])
+        self.formats = formats
+        self._transitions = [{}]
+        self._accepting = {}
+        for plate_format in formats:
+            state = 0
+            for symbol in plate_format:
+                if symbol not in (LETTER, DIGIT):
+                    symbol = SEPARATOR
+                edges = self._transitions[state]
+                if symbol not in edges:
+                    edges[symbol] = len(self._transitions)
+                    self._transitions.append({})
+                state = edges[symbol]
+            self._accepting[state] = plate_format
+
+    def _step(self, state: int, symbol: str):
+        """States reached from `state` on a letter or digit, skipping an optional separator"""
+        edges = self._transitions[state]
+        if symbol in edges:
+            yield edges[symbol]
+        if SEPARATOR in edges and symbol in self._transitions[edges[SEPARATOR]]:
+            yield self._transitions[edges[SEPARATOR]][symbol]
+
+    def _format(self, state: int, chars: str) -> str:
+        """Lay decoded characters out like the accepting state's format"""
+        out = []
+        chars = iter(chars)
+        for symbol in self._accepting[state]:
+            out.append(next(chars) if symbol in (LETTER, DIGIT) else symbol)
+        return "".join(out)
+
+    def scan(self, text: str, registry: Optional[RegisteredPlatePrefixes] = None) -> List[PlateCandidate]:
+        """Find every plate-shaped run of `text` (uppercased OCR text) in one pass
+
+        Candidates start and end on word boundaries. With `registry`, runs
+        spelling a registered plate are returned too, even when they do not
+        fit a format. For each span only the reading with the fewest
+        corrections is kept.
+        """
+        best = {}
+
+        def emit(candidate):
+            key = (candidate.start, candidate.end)
+            current = best.get(key)
+            if current is None or candidate.corrections < current.corrections:
+                best[key] = candidate
+            elif candidate.corrections == current.corrections and candidate.registered != current.registered:
+                if normalize_plate_number(candidate.text) != normalize_plate_number(current.text):
+                    # Different readings: the registered plate is the plausible one
+                    if candidate.registered:
+                        best[key] = candidate
+                    return
+                # Same reading found both ways: keep the format's layout, flag it registered
+                if current.registered:
+                    best[key] = candidate
+                best[key].registered = True
+
+        # Live threads: (kind, state, start, after separator) -> (corrections, decoded chars).
+        # Grammar threads hold automaton states, registry threads the
+        # registered-plate prefix decoded so far.
+        threads = {}
+        length = len(text)
+        for i in range(length + 1):
+            char = text[i] if i < length else " "
+            alnum = char.isalnum()
+
+            if not alnum:
+                for (kind, state, start, after_separator), (corrections, chars) in threads.items():
+                    if after_separator:
+                        continue
+                    if kind == "grammar" and state in self._accepting:
+                        emit(PlateCandidate(self._format(state, chars), start, i, corrections))
+                    elif kind == "registry" and state in registry:
+                        emit(PlateCandidate(state, start, i, corrections, registered=True))
+
+            if alnum and (i == 0 or not text[i - 1].isalnum()):
+                threads[("grammar", 0, i, False)] = (0, "")
+                if registry is not None:
+                    threads[("registry", "", i, False)] = (0, "")
+
+            advanced = {}
+
+            def advance(key, value):
+                if key not in advanced or value[0] < advanced[key][0]:
+                    advanced[key] = value
+
+            for (kind, state, start, after_separator), (corrections, chars) in threads.items():
+                if char in SEPARATOR_CHARS:
+                    if not chars:
+                        continue
+                    if kind == "grammar":
+                        if after_separator:
+                            advance((kind, state, start, True), (corrections, chars))
+                        elif SEPARATOR in self._transitions[state]:
+                            advance((kind, self._transitions[state][SEPARATOR], start, True), (corrections, chars))
+                    else:
+                        advance((kind, state, start, True), (corrections, chars))
+                    continue
+
+                for symbol, decoded, cost in _readings(char):
+                    if corrections + cost > MAX_CORRECTIONS:
+                        continue
+                    if kind == "grammar":
+                        for next_state in self._step(state, symbol):
+                            advance((kind, next_state, start, False), (corrections + cost, chars + decoded))
+                    elif registry.has_prefix(state + decoded):
+                        advance((kind, state + decoded, start, False), (corrections + cost, chars + decoded))
+            threads = advanced
+
+        return sorted(best.values(), key=lambda c: (c.start, c.end))
+
+    def matches(self, plate: str) -> bool:
+        """Whether a normalized plate fits one of the formats as read, without corrections"""
+        return any(
+            c.start == 0 and c.end == len(plate) and c.corrections == 0
+            for c in self.scan(plate)
+        )
+
+plate_grammar = PlateGrammar(PLATE_FORMATS or PLATE_REGIONS.get(PLATE_REGION, PLATE_REGIONS["generic"]))
+
+def find_plates(text: str) -> List[PlateCandidate]:
+    """Scan uppercased OCR text for plate candidates with the configured grammar"""
+    registry = None
+    if PLATE_REGISTRY_DECODING:
+        registered_prefixes.ensure_loaded()
+        registry = registered_prefixes
+    return plate_grammar.scan(text, registry)
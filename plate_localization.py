@@ -0,0 +1,107 @@
+"""
+Plate localization stage of the plate detection pipeline
+Finds rectangular, plate-shaped regions in a camera frame so OCR only has
+to read a few small, rectified crops instead of the whole frame
+"""
+
+import os
+from typing import List
+import cv2
+import imutils
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PLATE_LOCALIZATION = os.getenv("PLATE_LOCALIZATION", "true").lower() == "true"
+PLATE_MAX_REGIONS = int(os.getenv("PLATE_MAX_REGIONS", "3"))
+
+# Plate outline constraints: width / height, share of the frame area and
+# the smallest outline (in pixels) that can still hold readable characters.
+# There is no upper area bound so tight plate crops are read as one region.
+PLATE_MIN_ASPECT = 1.5
+PLATE_MAX_ASPECT = 6.5
+PLATE_MIN_AREA = 0.001
+PLATE_MIN_WIDTH = 60
+PLATE_MIN_HEIGHT = 15
+
+# Crops are upscaled to at least this height; Tesseract reads characters
+# best when they are roughly 30px or taller
+ROI_MIN_HEIGHT = 64
+
+# Only the largest contours are checked, plate borders are rarely tiny
+CONTOUR_CANDIDATES = 30
+
+def _overlaps(box, boxes, threshold=0.5):
+    """Check whether `box` (x, y, w, h) mostly overlaps any of `boxes`"""
+    x, y, w, h = box
+    for ox, oy, ow, oh in boxes:
+        ix = max(0, min(x + w, ox + ow) - max(x, ox))
+        iy = max(0, min(y + h, oy + oh) - max(y, oy))
+        if ix * iy > threshold * min(w * h, ow * oh):
+            return True
+    return False
+
+def rectify_region(gray: np.ndarray, corners: np.ndarray) -> np.ndarray:
+    """Warp the quadrilateral given by four corner points into an upright rectangle"""
+    corners = corners.astype("float32")
+    # Order corners top-left, top-right, bottom-right, bottom-left
+    sums = corners.sum(axis=1)
+    diffs = np.diff(corners, axis=1).ravel()
+    tl, br = corners[np.argmin(sums)], corners[np.argmax(sums)]
+    tr, bl = corners[np.argmin(diffs)], corners[np.argmax(diffs)]
+    source = np.array([tl, tr, br, bl], dtype="float32")
+
+    width = int(max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl)))
+    height = int(max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl)))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype="float32")
+    matrix = cv2.getPerspectiveTransform(source, target)
+    return cv2.warpPerspective(gray, matrix, (width, height))
+
+def prepare_region(region: np.ndarray) -> np.ndarray:
+    """Upscale a small plate crop to a size Tesseract reads well"""
+    height = region.shape[0]
+    if height < ROI_MIN_HEIGHT:
+        scale = ROI_MIN_HEIGHT / height
+        region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return region
+
+def locate_plates(image: np.ndarray, max_regions: int = PLATE_MAX_REGIONS) -> List[np.ndarray]:
+    """Return rectified grayscale crops of the most plate-like regions, largest first
+
+    Returns an empty list when nothing plate-shaped is found, in which case
+    the caller should fall back to reading the whole frame.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    frame_area = gray.shape[0] * gray.shape[1]
+
+    # Smooth texture but keep the plate border sharp, then trace edges
+    filtered = cv2.bilateralFilter(gray, 11, 17, 17)
+    edged = cv2.Canny(filtered, 30, 200)
+    contours = imutils.grab_contours(cv2.findContours(edged, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE))
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)[:CONTOUR_CANDIDATES]
+
+    regions = []
+    boxes = []
+    for contour in contours:
+        perimeter = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.018 * perimeter, True)
+        if len(approx) != 4:
+            continue
+
+        box = cv2.boundingRect(approx)
+        _, _, w, h = box
+        if h == 0 or not PLATE_MIN_ASPECT <= w / h <= PLATE_MAX_ASPECT:
+            continue
+        if w < PLATE_MIN_WIDTH or h < PLATE_MIN_HEIGHT or (w * h) / frame_area < PLATE_MIN_AREA:
+            continue
+        if _overlaps(box, boxes):
+            continue
+
+        boxes.append(box)
+        regions.append(prepare_region(rectify_region(gray, approx.reshape(4, 2))))
+        if len(regions) >= max_regions:
+            break
+
+    return regions
@@ -0,0 +1,198 @@
+"""
+Fuzzy plate matching for OCR reads
+Matches OCR candidates against the vehicle registry while treating common
+OCR confusions (O/0, I/1, B/8, S/5, ...) as cheap substitutions
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+from sqlalchemy import text
+from dotenv import load_dotenv
+from database import engine, normalize_plate_number, chunked
+from plate_cache import registry_listeners
+
+# Load environment variables
+load_dotenv()
+
+# Largest weighted edit distance accepted as a match. A confusable
+# substitution costs CONFUSION_COST, any other edit costs 1.
+FUZZY_MAX_DISTANCE = float(os.getenv("FUZZY_MAX_DISTANCE", "1.5"))
+CONFUSION_COST = 0.5
+
+# Characters Tesseract commonly mistakes for each other on plates
+CONFUSION_GROUPS = ["O0DQ", "I1L", "B8", "S5", "Z2", "G6"]
+
+_CONFUSION_GROUP = {c: i for i, group in enumerate(CONFUSION_GROUPS) for c in group}
+# Collapses every confusion group onto one representative character
+_CANONICAL = str.maketrans({c: group[0] for group in CONFUSION_GROUPS for c in group})
+_CANONICAL_ALPHABET = "".join(sorted(set(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789".translate(_CANONICAL)
+)))
+
+def canonical_plate(normalized_plate: str) -> str:
+    """Map a normalized plate onto its confusion-insensitive form"""
+    return normalized_plate.translate(_CANONICAL)
+
+def substitution_cost(a: str, b: str) -> float:
+    """Cost of reading character `b` where `a` was printed"""
+    if a == b:
+        return 0.0
+    group = _CONFUSION_GROUP.get(a)
+    if group is not None and group == _CONFUSION_GROUP.get(b):
+        return CONFUSION_COST
+    return 1.0
+
+def plate_distance(a: str, b: str) -> float:
+    """Weighted Levenshtein distance between two normalized plates"""
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j - 1] + substitution_cost(char_a, char_b),
+                previous[j] + 1,
+                current[j - 1] + 1
+            ))
+        previous = current
+    return previous[-1]
+
+def _single_edits(word: str) -> set:
+    """All strings one insertion, deletion or substitution away from `word`"""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    edits = {left + right[1:] for left, right in splits if right}
+    edits.update(left + c + right[1:] for left, right in splits if right for c in _CANONICAL_ALPHABET)
+    edits.update(left + c + right for left, right in splits for c in _CANONICAL_ALPHABET)
+    return edits
+
+@dataclass
+class PlateMatch:
+    plate: str  # Normalized registered plate
+    distance: float
+    score: float
+
+class FuzzyPlateIndex:
+    """Confusion-aware nearest-plate index over the vehicle registry
+
+    Plates are bucketed by their canonical form, so a read that only differs
+    by confusable characters is a single hash lookup. Reads with one other
+    OCR error are found by probing the canonical forms one edit away from
+    the query (a few hundred hash lookups), which keeps queries well under a
+    millisecond without the memory cost of a deletion index or the Python
+    overhead of walking a BK-tree. Candidates are then scored with the
+    weighted edit distance.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self):
+        return sum(len(plates) for plates in self._buckets.values())
+
+    def __contains__(self, plate: str) -> bool:
+        """Whether `plate` is exactly a registered plate (after normalization)"""
+        self.ensure_loaded()
+        query = normalize_plate_number(plate)
+        return query in self._buckets.get(canonical_plate(query), ())
+
+    def plates(self) -> List[str]:
+        """Every registered normalized plate"""
+        self.ensure_loaded()
+        with self._lock:
+            return [plate for plates in self._buckets.values() for plate in plates]
+
+    def add(self, normalized_plate: str):
+        if not normalized_plate:
+            return
+        with self._lock:
+            plates = self._buckets.setdefault(canonical_plate(normalized_plate), [])
+            if normalized_plate not in plates:
+                plates.append(normalized_plate)
+
+    def remove(self, normalized_plate: str):
+        if not normalized_plate:
+            return
+        key = canonical_plate(normalized_plate)
+        with self._lock:
+            plates = self._buckets.get(key)
+            if plates and normalized_plate in plates:
+                plates.remove(normalized_plate)
+                if not plates:
+                    del self._buckets[key]
+
+    def load(self):
+        """(Re)build the index from the vehicles table"""
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT normalized_plate FROM vehicles WHERE normalized_plate IS NOT NULL"
+            )).fetchall()
+        buckets = {}
+        for (plate,) in rows:
+            buckets.setdefault(canonical_plate(plate), []).append(plate)
+        with self._lock:
+            self._buckets = buckets
+            self._loaded = True
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def search(self, plate: str, max_distance: float = FUZZY_MAX_DISTANCE) -> List[PlateMatch]:
+        """Return registered plates within `max_distance` of `plate`, nearest first"""
+        self.ensure_loaded()
+        query = normalize_plate_number(plate)
+        if not query:
+            return []
+
+        canonical = canonical_plate(query)
+        keys = {canonical}
+        if max_distance >= 1:
+            keys.update(_single_edits(canonical))
+
+        candidates = set()
+        for key in keys:
+            plates = self._buckets.get(key)
+            if plates:
+                candidates.update(plates)
+
+        matches = []
+        for candidate in candidates:
+            distance = plate_distance(query, candidate)
+            if distance <= max_distance:
+                score = 1 - distance / max(len(query), len(candidate))
+                matches.append(PlateMatch(candidate, distance, round(score, 3)))
+        matches.sort(key=lambda m: (m.distance, m.plate))
+        return matches
+
+    def best_match(self, plate: str, max_distance: float = FUZZY_MAX_DISTANCE) -> Optional[PlateMatch]:
+        """Return the nearest registered plate, or None"""
+        matches = self.search(plate, max_distance)
+        return matches[0] if matches else None
+
+    def refresh(self, normalized_plates):
+        """Re-sync the given plates with the vehicles table after a registry write"""
+        if not self._loaded:
+            return
+        plates = [p for p in normalized_plates if p]
+        if not plates:
+            return
+        existing = set()
+        with engine.connect() as conn:
+            for chunk in chunked(plates):
+                params = {f"p{i}": p for i, p in enumerate(chunk)}
+                placeholders = ", ".join(f":p{i}" for i in range(len(chunk)))
+                existing.update(row[0] for row in conn.execute(
+                    text(f"SELECT normalized_plate FROM vehicles WHERE normalized_plate IN ({placeholders})"),
+                    params
+                ))
+        for plate in plates:
+            if plate in existing:
+                self.add(plate)
+            else:
+                self.remove(plate)
+
+plate_index = FuzzyPlateIndex()
+registry_listeners.append(plate_index.refresh)
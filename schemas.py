@@ -60,12 +60,22 @@ class DetectionLogBase(BaseModel):
 class DetectionLog(DetectionLogBase):
     id: int
     detected_at: datetime
+    hit_count: Optional[int] = 1
+    last_seen_at: Optional[datetime] = None
     vehicle_id: Optional[int] = None
     vehicle: Optional[Vehicle] = None
     
     class Config:
         from_attributes = True
 
+class ArchivedDetectionLog(DetectionLogBase):
+    id: int
+    detected_at: datetime
+    hit_count: Optional[int] = 1
+    last_seen_at: Optional[datetime] = None
+    vehicle_id: Optional[int] = None
+    archived: bool = False
+
 # Combined schemas for responses
 class VehicleWithOwner(BaseModel):
     vehicle: Vehicle
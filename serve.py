@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Multi-process server launcher
+OCR is CPU-bound and one Python process only keeps about one core busy
+with everything around it, so this starts several uvicorn workers, one per
+core by default, each with an OCR pool sized to its share of the cores:
+
+    python serve.py                 # one worker per core
+    python serve.py --workers 4 --port 8001
+
+Workers share nothing but the SQLite database (opened in WAL mode with a
+busy timeout) and the image store. Each one warms its OCR engines and
+caches at startup, and applies the registry and hotlist changes made by
+the others (see cache_sync.py).
+"""
+
+import os
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
+APP_PORT = int(os.getenv("APP_PORT", "8001"))
+
+def configure_workers(workers: int, ocr_threads: int = None):
+    """Set the environment every worker process inherits
+
+    OCR_WORKERS from .env or the environment is kept unless --ocr-threads
+    is given; otherwise workers split the cores between their OCR pools
+    instead of each starting one thread per core.
+    """
+    os.environ["WEB_WORKERS"] = str(workers)
+    if ocr_threads:
+        os.environ["OCR_WORKERS"] = str(ocr_threads)
+    else:
+        os.environ.setdefault("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the detection server with several worker processes")
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="Worker processes (default: one per core)")
+    parser.add_argument("--ocr-threads", type=int, help="OCR passes run at once per worker (default: OCR_WORKERS, or cores / workers)")
+    parser.add_argument("--host", default=APP_HOST)
+    parser.add_argument("--port", type=int, default=APP_PORT)
+    args = parser.parse_args()
+
+    configure_workers(args.workers, args.ocr_threads)
+
+    # Create and migrate the database once, before the workers race to do it
+    import database  # noqa: F401
+    import uvicorn
+
+    print(f"Starting {args.workers} workers with {os.environ['OCR_WORKERS']} OCR threads each "
+          f"on {args.host}:{args.port}")
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
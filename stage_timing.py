@@ -0,0 +1,113 @@
+"""
+Per-stage timing for plate detection
+A StageTimer follows one detection through decode, preprocessing, each
+OCR pass, registry lookup and the commit. Its breakdown is returned in a
+Server-Timing header, recorded into latency histograms served at /metrics
+and printed for requests slower than DETECT_SLOW_MS.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Detections slower than this are logged with their stage breakdown (0 disables)
+DETECT_SLOW_MS = float(os.getenv("DETECT_SLOW_MS", "3000"))
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class StageTimer:
+    """Milliseconds spent per stage of one detection, in the order stages ran
+
+    A stage recorded more than once (candidate extraction after every OCR
+    stage, a pass run on several plate crops) adds up. OCR passes of one
+    stage run in parallel, so their times overlap and can sum to more than
+    the total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - start) * 1000)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def breakdown(self) -> dict:
+        """Rounded ms per stage plus the total"""
+        timings = {stage: round(ms, 2) for stage, ms in self.stages.items()}
+        timings["total"] = round(self.total_ms(), 2)
+        return timings
+
+    def server_timing(self, timings: dict = None) -> str:
+        """Server-Timing header value, e.g. decode;dur=3.1, ocr-psm8;dur=412.5, total;dur=431.0
+
+        Pass a breakdown already taken so the header matches it exactly.
+        """
+        timings = timings if timings is not None else self.breakdown()
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items())
+
+class StageHistograms:
+    """Cumulative latency histograms per outcome and stage in the Prometheus text format"""
+
+    def __init__(self, name: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._stages = {}  # (outcome, stage) -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, timings: dict, outcome: str = "success"):
+        """Record one detection's breakdown (ms per stage); `outcome` is success or error"""
+        with self._lock:
+            for stage, ms in timings.items():
+                seconds = ms / 1000
+                counts = self._stages.get((outcome, stage))
+                if counts is None:
+                    counts = self._stages[(outcome, stage)] = [0] * (len(self.buckets) + 1) + [0.0]
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        counts[i] += 1
+                counts[-2] += 1
+                counts[-1] += seconds
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} Time spent per detection stage",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            for (outcome, stage), counts in self._stages.items():
+                labels = f'outcome="{outcome}",stage="{stage}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {counts[-2]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {counts[-1]:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {counts[-2]}')
+        return "\n".join(lines) + "\n"
+
+detect_stage_seconds = StageHistograms("plate_detect_stage_seconds")
+
+def record_detection(timer: StageTimer, source: str, outcome: str = "success") -> dict:
+    """Record a finished or failed detection in the histograms, log it if slow, and return its breakdown"""
+    timings = timer.breakdown()
+    detect_stage_seconds.observe(timings, outcome)
+    if DETECT_SLOW_MS and timings["total"] >= DETECT_SLOW_MS:
+        stages = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items() if stage != "total")
+        print(f"Slow detection ({source}, {outcome}, {timings['total']:.0f} ms): {stages}")
+    return timings
@@ -2,6 +2,10 @@ let currentTab = 'upload';
 let selectedFile = null;
 let capturedImageData = null;
 let stream = null;
+let liveSocket = null;
+let liveTimer = null;
+// Identifies this page's camera so the server can skip near-identical frames
+const cameraId = Math.random().toString(36).slice(2);
 
 // Elements
 const fileInput = document.getElementById('fileInput');
@@ -13,6 +17,7 @@ const capturedImage = document.getElementById('capturedImage');
 const startCameraBtn = document.getElementById('startCameraBtn');
 const captureBtn = document.getElementById('captureBtn');
 const retakeBtn = document.getElementById('retakeBtn');
+const liveBtn = document.getElementById('liveBtn');
 const manualInput = document.getElementById('manualInput');
 const detectBtn = document.getElementById('detectBtn');
 const results = document.getElementById('results');
@@ -93,6 +98,7 @@ startCameraBtn.addEventListener('click', async () => {
         cameraVideo.srcObject = stream;
         startCameraBtn.classList.add('hidden');
         captureBtn.classList.remove('hidden');
+        liveBtn.classList.remove('hidden');
     } catch (err) {
         alert('Unable to access camera. Please ensure you have granted camera permissions.');
     }
@@ -110,6 +116,7 @@ captureBtn.addEventListener('click', () => {
     
     cameraVideo.style.display = 'none';
     captureBtn.classList.add('hidden');
+    liveBtn.classList.add('hidden');
     retakeBtn.classList.remove('hidden');
     
     stopCamera();
@@ -123,11 +130,66 @@ retakeBtn.addEventListener('click', () => {
     capturedImageData = null;
 });
 
+// Live detection: stream JPEG frames over a WebSocket. The server only
+// reads the newest frame while OCR is busy, and frames are not sent while
+// the previous one is still being uploaded
+const LIVE_FRAME_INTERVAL = 200;
+
+function sendLiveFrame() {
+    if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN || liveSocket.bufferedAmount > 0) {
+        return;
+    }
+    const context = cameraCanvas.getContext('2d');
+    cameraCanvas.width = cameraVideo.videoWidth;
+    cameraCanvas.height = cameraVideo.videoHeight;
+    context.drawImage(cameraVideo, 0, 0);
+    cameraCanvas.toBlob(blob => {
+        if (blob && liveSocket && liveSocket.readyState === WebSocket.OPEN) {
+            liveSocket.send(blob);
+        }
+    }, 'image/jpeg', 0.8);
+}
+
+function startLiveDetection() {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    liveSocket = new WebSocket(`${protocol}://${window.location.host}/plate/ws/detect?camera_id=${cameraId}`);
+    liveSocket.binaryType = 'arraybuffer';
+    liveSocket.onmessage = (event) => displayResults(JSON.parse(event.data));
+    liveSocket.onclose = () => stopLiveDetection();
+    liveTimer = setInterval(sendLiveFrame, LIVE_FRAME_INTERVAL);
+    liveBtn.textContent = 'Stop Live Detection';
+    captureBtn.classList.add('hidden');
+}
+
+function stopLiveDetection() {
+    clearInterval(liveTimer);
+    liveTimer = null;
+    if (liveSocket) {
+        const socket = liveSocket;
+        liveSocket = null;
+        socket.close();
+    }
+    liveBtn.textContent = 'Start Live Detection';
+    if (stream) {
+        captureBtn.classList.remove('hidden');
+    }
+}
+
+liveBtn.addEventListener('click', () => {
+    if (liveSocket) {
+        stopLiveDetection();
+    } else {
+        startLiveDetection();
+    }
+});
+
 function stopCamera() {
     if (stream) {
         stream.getTracks().forEach(track => track.stop());
         stream = null;
     }
+    stopLiveDetection();
+    liveBtn.classList.add('hidden');
 }
 
 // Detection
@@ -140,6 +202,7 @@ detectBtn.addEventListener('click', async () => {
         hasInput = true;
     } else if (currentTab === 'camera' && capturedImageData) {
         formData.append('image_data', capturedImageData);
+        formData.append('camera_id', cameraId);
         hasInput = true;
     } else if (currentTab === 'manual' && manualInput.value.trim()) {
         formData.append('manual_plate', manualInput.value.trim());
@@ -170,6 +233,14 @@ detectBtn.addEventListener('click', async () => {
     }
 });
 
+// Labels for the hotlist reasons returned with flagged plates
+const ALERT_REASONS = {
+    unpaid_violations: 'Unpaid violations',
+    overdue_violations: 'Overdue violations',
+    expired_registration: 'Expired registration',
+    suspended_registration: 'Suspended registration'
+};
+
 function displayResults(data) {
     results.classList.remove('hidden');
     resultsContent.innerHTML = '';
@@ -205,11 +276,23 @@ function displayResults(data) {
                 `;
             }
             
+            let alertInfo = '';
+            if (plate.alert) {
+                const reasons = plate.alert.reasons.map(reason => ALERT_REASONS[reason] || reason).join(', ');
+                alertInfo = `
+                    <div class="plate-alert">
+                        <strong>Flagged:</strong> ${reasons}
+                        ${plate.alert.outstanding_amount > 0 ? `<br>Outstanding: ${plate.alert.outstanding_amount.toFixed(2)}` : ''}
+                    </div>
+                `;
+            }
+            
             plateDiv.innerHTML = `
                 <div class="plate-header">
                     <div class="plate-number">${plate.text}</div>
                     <div class="confidence">Confidence: ${plate.confidence}%</div>
                 </div>
+                ${alertInfo}
                 ${vehicleInfo}
             `;
             resultsContent.appendChild(plateDiv);
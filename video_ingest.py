@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Video and MJPEG stream ingestion
+Decodes frames with OpenCV, skips frames that have not changed, runs the
+remaining frames through the /detect OCR pipeline in batches, and logs
+each plate once per pass in front of the camera (with its best read)
+instead of once per frame.
+
+    python video_ingest.py recording.mp4
+    python video_ingest.py http://camera.local/mjpg/video.mjpg
+    python video_ingest.py recording.mp4 --dry-run
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+import cv2
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from database import SessionLocal, normalize_plate_number
+from detection import MAX_PLATES_PER_IMAGE, limit_image_size, read_plate_candidates, rank_matches
+from log_writer import log_writer
+
+# Load environment variables
+load_dotenv()
+
+# Mean absolute pixel change (0-255, on a small grayscale thumbnail) that
+# makes a frame worth reading again
+VIDEO_CHANGE_THRESHOLD = float(os.getenv("VIDEO_CHANGE_THRESHOLD", "6.0"))
+# Read at least one frame in this many even if nothing changed
+VIDEO_MAX_SKIP = int(os.getenv("VIDEO_MAX_SKIP", "30"))
+# Sampled frames sent through OCR together
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+# A plate not read again within this many frames is considered gone
+VIDEO_TRACK_GAP = int(os.getenv("VIDEO_TRACK_GAP", "45"))
+# Reads needed before a plate is logged (raise to drop one-off misreads)
+VIDEO_MIN_HITS = int(os.getenv("VIDEO_MIN_HITS", "1"))
+
+# Size of the thumbnail used to compare frames
+SAMPLER_THUMBNAIL = (64, 36)
+
+class FrameSampler:
+    """Decides which frames are worth running OCR on"""
+
+    def __init__(self, threshold: float = VIDEO_CHANGE_THRESHOLD, max_skip: int = VIDEO_MAX_SKIP):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self._last = None
+        self._skipped = 0
+
+    def should_sample(self, frame: np.ndarray) -> bool:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumbnail = cv2.resize(gray, SAMPLER_THUMBNAIL, interpolation=cv2.INTER_AREA).astype(np.int16)
+        changed = self._last is None or np.abs(thumbnail - self._last).mean() >= self.threshold
+        if changed or self._skipped >= self.max_skip:
+            self._last = thumbnail
+            self._skipped = 0
+            return True
+        self._skipped += 1
+        return False
+
+@dataclass
+class PlateTrack:
+    key: str
+    text: str
+    confidence: int
+    vehicle_id: Optional[int]
+    first_frame: int
+    last_frame: int
+    best_frame: int
+    hits: int = 1
+
+class PlateTracker:
+    """Collapses repeated reads of the same plate across nearby frames"""
+
+    def __init__(self, max_gap: int = VIDEO_TRACK_GAP, min_hits: int = VIDEO_MIN_HITS):
+        self.max_gap = max_gap
+        self.min_hits = min_hits
+        self.active = {}
+
+    def update(self, frame_index: int, key: str, text: str, confidence: int, vehicle_id=None):
+        track = self.active.get(key)
+        if track is None:
+            self.active[key] = PlateTrack(key, text, confidence, vehicle_id, frame_index, frame_index, frame_index)
+            return
+        track.hits += 1
+        track.last_frame = frame_index
+        if confidence > track.confidence:
+            track.text, track.confidence, track.best_frame = text, confidence, frame_index
+
+    def expire(self, frame_index: int):
+        """Close and return tracks not seen within the gap"""
+        closed = [t for t in self.active.values() if frame_index - t.last_frame > self.max_gap]
+        for track in closed:
+            del self.active[track.key]
+        return [t for t in closed if t.hits >= self.min_hits]
+
+    def flush(self):
+        """Close and return every remaining track"""
+        closed = [t for t in self.active.values() if t.hits >= self.min_hits]
+        self.active = {}
+        return closed
+
+async def ingest_video(location: str, source: str = "video", dry_run: bool = False,
+                       max_frames: Optional[int] = None) -> dict:
+    """Run a video file or MJPEG stream through plate detection
+
+    Logs one DetectionLog per tracked plate unless `dry_run` is set, and
+    returns a summary with the tracked plates.
+    """
+    capture = cv2.VideoCapture(location)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source {location}")
+
+    db = SessionLocal()
+    sampler = FrameSampler()
+    tracker = PlateTracker()
+    tracks = []
+    frames_read = 0
+    frames_sampled = 0
+    passes_run = 0
+
+    async def process_batch(batch):
+        nonlocal passes_run
+        results = await asyncio.gather(*(read_plate_candidates(frame) for _, frame in batch))
+        for (frame_index, _), (plates, frame_passes, _) in zip(batch, results):
+            passes_run += frame_passes
+            for plate, vehicle, _ in rank_matches(db, plates)[:MAX_PLATES_PER_IMAGE]:
+                # Reads matched to the same registered plate share a track
+                key = normalize_plate_number(vehicle['plate_number'] if vehicle else plate['text'])
+                tracker.update(frame_index, key, plate['text'], plate['confidence'],
+                               vehicle['vehicle_id'] if vehicle else None)
+        closed = tracker.expire(batch[-1][0])
+        log_tracks(closed)
+
+    def log_tracks(closed):
+        tracks.extend(closed)
+        if dry_run or not closed:
+            return
+        log_writer.add([{
+            "plate_number": track.text.upper(),
+            "detected_text": track.text,
+            "confidence": track.confidence,
+            "source": source,
+            "detected_at": datetime.utcnow(),
+            "vehicle_id": track.vehicle_id
+        } for track in closed], location)
+
+    try:
+        batch = []
+        while max_frames is None or frames_read < max_frames:
+            ok, frame = await run_in_threadpool(capture.read)
+            if not ok:
+                break
+            frames_read += 1
+            if not sampler.should_sample(frame):
+                continue
+            frames_sampled += 1
+            batch.append((frames_read - 1, limit_image_size(frame)))
+            if len(batch) >= VIDEO_BATCH_SIZE:
+                await process_batch(batch)
+                batch = []
+        if batch:
+            await process_batch(batch)
+        log_tracks(tracker.flush())
+        # Everything is logged once the pass is done
+        await run_in_threadpool(log_writer.flush)
+    finally:
+        capture.release()
+        db.close()
+
+    return {
+        "source": location,
+        "frames_read": frames_read,
+        "frames_sampled": frames_sampled,
+        "ocr_passes": passes_run,
+        "plates": [
+            {
+                "text": t.text,
+                "confidence": t.confidence,
+                "hits": t.hits,
+                "first_frame": t.first_frame,
+                "last_frame": t.last_frame,
+                "best_frame": t.best_frame,
+                "vehicle_id": t.vehicle_id
+            }
+            for t in tracks
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect plates in a video file or MJPEG stream")
+    parser.add_argument("location", help="Video file path or stream URL")
+    parser.add_argument("--source", default="video", help="Source recorded on detection logs")
+    parser.add_argument("--dry-run", action="store_true", help="Print detections without logging them")
+    parser.add_argument("--max-frames", type=int, help="Stop after this many frames (for live streams)")
+    args = parser.parse_args()
+
+    try:
+        summary = asyncio.run(ingest_video(args.location, args.source, args.dry_run, args.max_frames))
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    print(f"Read {summary['frames_read']} frames, ran OCR on {summary['frames_sampled']} "
+          f"({summary['ocr_passes']} passes)")
+    for plate in summary["plates"]:
+        print(f"  - {plate['text']} (confidence {plate['confidence']}, {plate['hits']} reads, "
+              f"frames {plate['first_frame']}-{plate['last_frame']})")
+
+if __name__ == "__main__":
+    main()